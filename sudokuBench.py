@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+
+"""This script benchmarks sudokuSolver offline against the puzzle corpora bundled in benchmarks/."""
+
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import time
+
+import sudokuSolver
+
+
+# one puzzle per line, with its solution, in benchmarks/<name>.txt
+corpusDir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks')
+corpusNames = ['easy', 'medium', 'hard', '17-clue', 'pathological']
+
+# the numbers checked against a baseline, whether bigger is better, and how many puzzles a corpus needs before
+# the number stands for more than a few of them. meanNodes is the same on every run of the same code; the timings
+# can move by 20-50% between runs on a busy or virtual machine, so they're only checked when asked to (with their
+# own threshold). p99Ms and maxMs are only reported - with 50 puzzles or fewer a corpus's p99 is its slowest one
+trackedMetrics = {'meanNodes': (False, 0)}
+timedMetrics = {'throughput': (True, 0), 'p50Ms': (False, 20)}
+
+# results are only comparable if these meta entries match
+comparedMeta = ['backend', 'repeat']
+
+
+##################################################
+# FUNCTIONS
+##################################################
+def loadCorpus(name):
+    return list(sudokuSolver.readPuzzles(os.path.join(corpusDir, name + '.txt')))
+
+
+def percentile(sortedValues, fraction):
+    # nearest-rank percentile of an already sorted list
+    if not sortedValues:
+        return 0
+    rank = int(math.ceil(fraction * len(sortedValues))) - 1
+    return sortedValues[max(0, min(rank, len(sortedValues) - 1))]
+
+
+def benchCorpus(puzzles, backend='strategies', repeat=3):
+    # time each puzzle repeat times and keep its fastest run, then solve everything once more with stats on
+    # (the timed runs leave stats off so the counters don't slow them down)
+    latencies = []
+    solved = 0
+    correct = 0
+    for puzzle, solution in puzzles:
+        valueList, solvedList = sudokuSolver.splitPuzzle(puzzle)
+        best = None
+        for r in range(repeat):
+            start = time.perf_counter_ns()
+            result = sudokuSolver.solvePuzzle(valueList, solvedList, backend=backend)
+            elapsed = time.perf_counter_ns() - start
+            if best is None or elapsed < best:
+                best = elapsed
+        latencies.append(best)
+        solved += '0' not in result
+        correct += result == solution
+
+    stats = sudokuSolver.SolveStats()
+    maxNodes = 0
+    for puzzle, solution in puzzles:
+        valueList, solvedList = sudokuSolver.splitPuzzle(puzzle)
+        puzzleStats = sudokuSolver.SolveStats()
+        sudokuSolver.solvePuzzle(valueList, solvedList, backend=backend, stats=puzzleStats)
+        maxNodes = max(maxNodes, puzzleStats.nodes)
+        stats.merge(puzzleStats)
+
+    latencies.sort()
+    total = sum(latencies)
+    counters = stats.asDict()
+    return {
+        'puzzles': len(puzzles),
+        'solved': solved,
+        'correct': correct,
+        'throughput': len(puzzles) / (total / 1e9) if total else 0.0,
+        'p50Ms': percentile(latencies, 0.50) / 1e6,
+        'p99Ms': percentile(latencies, 0.99) / 1e6,
+        'maxMs': latencies[-1] / 1e6 if latencies else 0.0,
+        'meanNodes': stats.nodes / len(puzzles) if puzzles else 0.0,
+        'maxNodes': maxNodes,
+        'phases': counters['phases'],
+        'strategies': counters['strategies'],
+    }
+
+
+def runBenchmarks(names=corpusNames, backend='strategies', repeat=3):
+    results = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'backend': backend,
+            'repeat': repeat,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'corpora': {},
+    }
+    for name in names:
+        results['corpora'][name] = benchCorpus(loadCorpus(name), backend, repeat)
+
+    return results
+
+
+def setupDifferences(current, baseline):
+    # the meta entries that differ between two runs - a baseline run some other way can't be compared against
+    before = baseline.get('meta', {})
+    return [key + ': ' + str(before.get(key)) + ' -> ' + str(current['meta'][key])
+            for key in comparedMeta if before.get(key) != current['meta'][key]]
+
+
+def compareResults(current, baseline, threshold=0.2, timeThreshold=None):
+    # list every tracked metric that got worse than the baseline by more than threshold (0.2 = 20%),
+    # and every timed one by more than timeThreshold if there is one
+    # raises ValueError if the baseline wasn't run the same way (see comparedMeta)
+    differences = setupDifferences(current, baseline)
+    if differences:
+        raise ValueError('the baseline was run differently (' + ', '.join(differences) + ')')
+
+    metrics = [(metric, settings, threshold) for metric, settings in trackedMetrics.items()]
+    if timeThreshold is not None:
+        metrics += [(metric, settings, timeThreshold) for metric, settings in timedMetrics.items()]
+
+    regressions = []
+    for name, result in current['corpora'].items():
+        before = baseline.get('corpora', {}).get(name)
+        if not before:
+            continue
+
+        for metric, (biggerIsBetter, minPuzzles), limit in metrics:
+            if min(result['puzzles'], before.get('puzzles', 0)) < minPuzzles:
+                continue
+            old = before.get(metric)
+            new = result.get(metric)
+            if not old or new is None:
+                continue
+
+            change = (new - old) / old
+            if (biggerIsBetter and change < -limit) or (not biggerIsBetter and change > limit):
+                regressions.append(name + ' ' + metric + ': ' + format(old, '.4g') + ' -> ' + format(new, '.4g') +
+                                   ' (' + format(change * 100, '+.1f') + '%)')
+
+        if result['correct'] < before.get('correct', 0):
+            regressions.append(name + ' correct: ' + str(before['correct']) + ' -> ' + str(result['correct']))
+
+    return regressions
+
+
+def printResults(results):
+    print('corpus         puzzles  solved  per sec      p50 ms    p99 ms    max ms  mean nodes')
+    for name, result in results['corpora'].items():
+        print(name.ljust(15) + str(result['puzzles']).rjust(7) + str(result['solved']).rjust(8) +
+              format(result['throughput'], '.1f').rjust(9) + format(result['p50Ms'], '.3f').rjust(12) +
+              format(result['p99Ms'], '.3f').rjust(10) + format(result['maxMs'], '.3f').rjust(10) +
+              format(result['meanNodes'], '.1f').rjust(12))
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Benchmark sudokuSolver against the bundled puzzle corpora.')
+    parser.add_argument('--corpus', action='append', choices=corpusNames,
+                        help='corpus to run (repeatable, default: all of them)')
+    parser.add_argument('--backend', choices=['strategies', 'dlx'], default='strategies')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per puzzle - the fastest one counts')
+    parser.add_argument('--save', metavar='FILE', help='write the results to FILE as JSON')
+    parser.add_argument('--baseline', metavar='FILE', help='compare against results saved earlier with --save')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='how much worse than the baseline counts as a regression (default: 0.2 = 20%%)')
+    parser.add_argument('--time-threshold', type=float,
+                        help='also compare throughput and p50 against the baseline, allowing this much worse - '
+                             'only worth it on a quiet machine (default: timings aren\'t compared)')
+    args = parser.parse_args(argv)
+
+    results = runBenchmarks(args.corpus or corpusNames, args.backend, args.repeat)
+    printResults(results)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            try:
+                regressions = compareResults(results, json.load(f), args.threshold, args.time_threshold)
+            except ValueError as error:
+                sys.stderr.write('can\'t compare against ' + args.baseline + ': ' + str(error) + '\n')
+                return 2
+        for regression in regressions:
+            print('REGRESSION: ' + regression)
+        if regressions:
+            return 1
+        print('no regressions against ' + args.baseline)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,9 +2,24 @@
 
 """This script solves Sudoku puzzles by parsing their initial html starting state."""
 
+import argparse
+import json
+import mmap
+import os
+import random
+import struct
+import sys
 import time
-from urllib.request import urlopen
 import re
+from array import array
+from collections import OrderedDict, namedtuple
+from functools import partial
+from itertools import chain, combinations, islice, permutations, product
+from operator import getitem
+
+# logging, the scraper, the process pools, the solving service and numpy are only imported by the code that uses them,
+# so a single solve from the command line doesn't pay for loading them (see importNumpy for numpy)
+numpy = None
 
 
 """
@@ -23,10 +38,472 @@ for reference:
 """
 
 
+##################################################
+# BITMASKS
+##################################################
+# each location keeps its possibilities as a 9-bit mask - bit (n - 1) is set while n is still possible
+allDigits = 0x1FF
+digitBit = [0] + [1 << (n - 1) for n in range(1, 10)]  # value -> mask
+bitValue = {digitBit[n]: n for n in range(1, 10)}  # single-bit mask -> value
+bitCount = [bin(m).count('1') for m in range(512)]  # mask -> number of possibilities
+maskValues = [[n for n in range(1, 10) if m & digitBit[n]] for m in range(512)]  # mask -> list of possible values
+
+
+##################################################
+# GEOMETRY
+##################################################
+# built once at import time so the strategies can look up indices instead of recomputing them
+allRows = [[r * 9 + c for c in range(9)] for r in range(9)]
+allCols = [[r * 9 + c for r in range(9)] for c in range(9)]
+# block indices go down each column of the block first: [0, 9, 18, 1, 10, 19, 2, 11, 20]
+allBlocks = [[(b // 3) * 27 + (b % 3) * 3 + c + 9 * r for c in range(3) for r in range(3)] for b in range(9)]
+allUnits = allRows + allCols + allBlocks
+
+# location -> row, column and block numbers
+rowOf = [i // 9 for i in range(81)]
+colOf = [i % 9 for i in range(81)]
+blockOf = [(i // 27) * 3 + (i % 9) // 3 for i in range(81)]
+
+# location -> its unit numbers in allUnits (row, 9 + column, 18 + block), and the 20 other locations sharing one
+unitIdsOf = [(rowOf[i], 9 + colOf[i], 18 + blockOf[i]) for i in range(81)]
+unitNames = ['row'] * 9 + ['column'] * 9 + ['3x3 block'] * 9
+peerList = [sorted(set(allRows[rowOf[i]] + allCols[colOf[i]] + allBlocks[blockOf[i]]) - {i}) for i in range(81)]
+
+# block -> the 3 locations on each of its rows and columns, e.g. blockRowCells[4][1] = [39, 40, 41]
+blockRowCells = [[[blk[k], blk[k + 3], blk[k + 6]] for k in range(3)] for blk in allBlocks]
+blockColCells = [[blk[k * 3:k * 3 + 3] for k in range(3)] for blk in allBlocks]
+
+# block -> the 2 other blocks in the same row of blocks (band) and column of blocks (stack)
+bandBlocks = [[x for x in range((b // 3) * 3, (b // 3) * 3 + 3) if x != b] for b in range(9)]
+stackBlocks = [[x for x in range(b % 3, 9, 3) if x != b] for b in range(9)]
+
+# how values past 9 are written on bigger boards - 10 is 'A', 16 is 'G' and 25 is 'P'
+valueSymbols = '123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+
+class MaskTable(dict):
+    """mask -> fn(mask), worked out the first time each mask comes up - for boards with too many possible
+    masks to list them all up front like bitCount and maskValues do."""
+
+    def __init__(self, fn):
+        dict.__init__(self)
+        self.fn = fn
+
+    def __missing__(self, mask):
+        value = self[mask] = self.fn(mask)
+        return value
+
+
+class Geometry(object):
+    """The tables above for a board made of boxSize x boxSize blocks: 2 gives 4x4 boards, 3 the usual 9x9,
+    4 16x16 and 5 25x25. Every board carries one, and the search takes its tables from there.
+
+    Values run from 1 to size and are written as symbols[value], with symbols[0] = '0' for a blank,
+    and valueOf reads them back (either case, with '.' as a blank too)."""
+
+    __slots__ = ('boxSize', 'size', 'cells', 'allDigits', 'digitBit', 'bitValue', 'bitCount', 'maskValues',
+                 'maskType', 'allUnits', 'unitIdsOf', 'unitNames', 'peerList', 'peerSets', 'intersections', 'symbols',
+                 'valueOf')
+
+    def __init__(self, boxSize):
+        n = boxSize * boxSize
+        if not 2 <= boxSize or n > len(valueSymbols):
+            raise ValueError('unsupported box size: ' + str(boxSize))
+
+        self.boxSize = boxSize
+        self.size = n
+        self.cells = n * n
+
+        self.allDigits = (1 << n) - 1
+        self.digitBit = [0] + [1 << (v - 1) for v in range(1, n + 1)]
+        self.bitValue = {self.digitBit[v]: v for v in range(1, n + 1)}
+        if n <= 9:
+            self.bitCount = [bin(m).count('1') for m in range(1 << n)]
+            self.maskValues = [[v for v in range(1, n + 1) if m & self.digitBit[v]] for m in range(1 << n)]
+        else:
+            self.bitCount = MaskTable(lambda m: bin(m).count('1'))
+            self.maskValues = MaskTable(lambda m: [v for v in range(1, n + 1) if m & self.digitBit[v]])
+        self.maskType = 'H' if n <= 16 else 'L'
+
+        # same layouts as the 9x9 tables, blocks included
+        rows = [[r * n + c for c in range(n)] for r in range(n)]
+        cols = [[r * n + c for r in range(n)] for c in range(n)]
+        blocks = [[(b // boxSize) * boxSize * n + (b % boxSize) * boxSize + c + n * r
+                   for c in range(boxSize) for r in range(boxSize)] for b in range(n)]
+        self.allUnits = rows + cols + blocks
+        blockName = str(boxSize) + 'x' + str(boxSize) + ' block'
+        self.unitNames = ['row'] * n + ['column'] * n + [blockName] * n
+
+        unitIdsOf = [[] for i in range(self.cells)]
+        for u, unit in enumerate(self.allUnits):
+            for i in unit:
+                unitIdsOf[i].append(u)
+        self.unitIdsOf = [tuple(ids) for ids in unitIdsOf]
+        self.peerList = [sorted(set().union(*(self.allUnits[u] for u in ids)) - {i})
+                         for i, ids in enumerate(self.unitIdsOf)]
+        self.peerSets = [frozenset(peers) for peers in self.peerList]
+
+        # where each block crosses a row or column: (line unit, block unit, the shared locations,
+        # the rest of the line, the rest of the block)
+        self.intersections = []
+        for b in range(2 * n, 3 * n):
+            block = set(self.allUnits[b])
+            for u in range(2 * n):
+                line = self.allUnits[u]
+                shared = [i for i in line if i in block]
+                if shared:
+                    self.intersections.append((u, b, shared, [i for i in line if i not in block],
+                                               [i for i in self.allUnits[b] if i not in shared]))
+
+        self.symbols = '0' + valueSymbols[:n]
+        self.valueOf = {'0': 0, '.': 0}
+        for v in range(1, n + 1):
+            self.valueOf[self.symbols[v]] = v
+            self.valueOf[self.symbols[v].lower()] = v
+
+    def valuesOf(self, text):
+        # a puzzle string's values, 0 for a blank - anything else is a ValueError(BAD_CHARACTERS)
+        valueOf = self.valueOf
+        try:
+            return [valueOf[char] for char in text]
+        except KeyError:
+            raise ValueError(BAD_CHARACTERS) from None
+
+
+# a Geometry for each board size used so far, by number of locations
+standardGeometry = Geometry(3)
+geometries = {81: standardGeometry}
+
+
+def geometryFor(cells):
+    # the Geometry for a board of that many locations - 16, 81, 256 or 625
+    geometry = geometries.get(cells)
+    if geometry is None:
+        boxSize = int(round(cells ** 0.25))
+        if boxSize ** 4 != cells:
+            raise ValueError('a puzzle of ' + str(cells) + ' locations isn\'t a square board of square blocks')
+        geometry = geometries[cells] = Geometry(boxSize)
+    return geometry
+
+
+# how a search ended, along with the number of guesses it made, the deepest it went, how often it backed up
+# and how many solutions it came across
+SOLVED = 'solved'
+UNSOLVABLE = 'unsolvable'
+BUDGET_EXCEEDED = 'budget exceeded'
+SearchResult = namedtuple('SearchResult', ['status', 'nodes', 'depth', 'backtracks', 'solutions'])
+
+# why a puzzle was turned away without searching it - the first three come from the puzzle string alone, the rest
+# from placing its givens and propagating them (see validatePuzzle and boardProblem)
+WRONG_LENGTH = 'wrong length'
+BAD_CHARACTERS = 'unexpected characters'
+REPEATED_GIVEN = 'repeats a given'
+NO_CANDIDATES = 'a location has no possible values'
+MISSING_VALUE = 'a unit has nowhere to put a value'
+CONTRADICTION = 'contradicts itself'
+
+
+##################################################
+# TRACING
+##################################################
+# the solver reports its progress through two sinks, each either None (off) or a callable taking a TraceEvent:
+#   summarySink gets 'start' (value = the puzzle), 'search' (value = status, detail = the SearchResult)
+#               and 'finish' (value = the result, detail = the solved flags) once per puzzle, plus 'reject'
+#               (value = the reason) for a puzzle that contradicts itself before any guessing
+#   stepSink gets 'solve' (detail = the reason) for every deduced location, 'eliminate' (value = the values
+#               taken out, detail = the reason) for every elimination made by a strategy pass, and 'guess'
+#               (detail = the depth) for every guess - hot loops only pay for a None check while it's off
+TraceEvent = namedtuple('TraceEvent', ['kind', 'index', 'value', 'detail'])
+TRACE_OFF = 0
+TRACE_SUMMARY = 1
+TRACE_STEPS = 2
+summarySink = None
+stepSink = None
+
+
+def setTrace(level, sink=None):
+    # pick how much the solver reports, and where to (the 'sudokuSolver' logger by default)
+    global summarySink, stepSink
+    if sink is None:
+        sink = logEvent
+    summarySink = sink if level >= TRACE_SUMMARY else None
+    stepSink = sink if level >= TRACE_STEPS else None
+
+
+def traceLogger():
+    # the 'sudokuSolver' logger - logging itself is only imported once there's something to log
+    import logging
+    return logging.getLogger('sudokuSolver')
+
+
+def logEvent(event):
+    logger = traceLogger()
+    if event.kind == 'solve':
+        logger.info('solving index %d - %s', event.index, event.detail)
+    elif event.kind == 'eliminate':
+        logger.info('removing %s from index %d - %s', event.value, event.index, event.detail)
+    elif event.kind == 'guess':
+        logger.info('guessing %d at index %d, depth %d', event.value, event.index, event.detail)
+    elif event.kind == 'search':
+        logger.info('%s after %d guesses', event.value, event.detail.nodes)
+    elif event.kind == 'reject':
+        logger.info('not searching - %s', event.value)
+    else:
+        logger.info('%s %s %s', event.kind, event.value, event.detail)
+
+
+class SudokuBoard(object):
+    """Working state of a puzzle: the value and possibility mask of each location, plus masks of the
+    values already placed in each unit (indexed like allUnits). Solved locations have an empty mask.
+
+    placed and changed queue the locations that were filled in or lost possibilities since the last
+    propagate() call, so only their neighbours get re-checked. trail logs the old mask of every change
+    so a guess can be rolled back with undoChanges(). stats is the SolveStats being collected, if any,
+    and geometry the board's size and layout (9x9 unless told otherwise)."""
+
+    __slots__ = ('values', 'masks', 'unitMasks', 'placed', 'changed', 'trail', 'stats', 'geometry')
+
+    def __init__(self, geometry=standardGeometry):
+        self.values = array('B', [0] * geometry.cells)
+        self.masks = array(geometry.maskType, [geometry.allDigits] * geometry.cells)
+        self.unitMasks = array(geometry.maskType, [0] * len(geometry.allUnits))
+        self.placed = []
+        self.changed = []
+        self.trail = []
+        self.stats = None
+        self.geometry = geometry
+
+    def copy(self):
+        board = SudokuBoard.__new__(SudokuBoard)
+        board.values = self.values[:]
+        board.masks = self.masks[:]
+        board.unitMasks = self.unitMasks[:]
+        board.placed = self.placed[:]
+        board.changed = self.changed[:]
+        board.trail = self.trail[:]
+        board.stats = self.stats
+        board.geometry = self.geometry
+        return board
+
+
+class SolveStats(object):
+    """Counters filled in by solvePuzzle(..., stats=SolveStats()). Hand the same object to every puzzle in a
+    batch to aggregate them, or merge() ones collected elsewhere (e.g. in worker processes).
+
+    strategies maps each strategy's name to [calls, placements, eliminations, nanoseconds], phases maps
+    'setup', 'propagation' and 'search' to nanoseconds, outcomes counts the searches by how they ended and
+    rejections the puzzles turned away before searching by why."""
+
+    def __init__(self):
+        self.puzzles = 0
+        self.strategies = {}
+        self.phases = {}
+        self.propagationPasses = 0
+        self.searches = 0
+        self.nodes = 0
+        self.backtracks = 0
+        self.maxDepth = 0
+        self.outcomes = {}
+        self.rejections = {}
+
+    def countStrategy(self, name, placements, eliminations, nanoseconds):
+        counts = self.strategies.get(name)
+        if counts is None:
+            counts = self.strategies[name] = [0, 0, 0, 0]
+        counts[0] += 1
+        counts[1] += placements
+        counts[2] += eliminations
+        counts[3] += nanoseconds
+
+    def countPhase(self, name, nanoseconds):
+        self.phases[name] = self.phases.get(name, 0) + nanoseconds
+
+    def countSearch(self, result):
+        self.searches += 1
+        self.nodes += result.nodes
+        self.backtracks += result.backtracks
+        self.maxDepth = max(self.maxDepth, result.depth)
+        self.outcomes[result.status] = self.outcomes.get(result.status, 0) + 1
+
+    def countRejection(self, reason):
+        self.rejections[reason] = self.rejections.get(reason, 0) + 1
+
+    def merge(self, other):
+        self.puzzles += other.puzzles
+        for name, counts in other.strategies.items():
+            mine = self.strategies.setdefault(name, [0, 0, 0, 0])
+            for k in range(4):
+                mine[k] += counts[k]
+        for name, nanoseconds in other.phases.items():
+            self.countPhase(name, nanoseconds)
+        self.propagationPasses += other.propagationPasses
+        self.searches += other.searches
+        self.nodes += other.nodes
+        self.backtracks += other.backtracks
+        self.maxDepth = max(self.maxDepth, other.maxDepth)
+        for status, count in other.outcomes.items():
+            self.outcomes[status] = self.outcomes.get(status, 0) + count
+        for reason, count in other.rejections.items():
+            self.rejections[reason] = self.rejections.get(reason, 0) + count
+        return self
+
+    def asDict(self):
+        return {
+            'puzzles': self.puzzles,
+            'strategies': {name: dict(zip(('calls', 'placements', 'eliminations', 'nanoseconds'), counts))
+                           for name, counts in self.strategies.items()},
+            'phases': dict(self.phases),
+            'propagationPasses': self.propagationPasses,
+            'searches': self.searches,
+            'nodes': self.nodes,
+            'backtracks': self.backtracks,
+            'maxDepth': self.maxDepth,
+            'outcomes': dict(self.outcomes),
+            'rejections': dict(self.rejections),
+        }
+
+
+##################################################
+# PROFILING
+##################################################
+class PuzzleProfile(object):
+    """Where solvePuzzle(..., profile=PuzzleProfile()) spent its time, by phase - 'propagation' for PART 1
+    and 'search' for PART 2 (or the dlx search). Nothing is profiled unless one is passed in.
+
+    mode 'cprofile' runs cProfile over each phase and keeps its raw stats (the dict pstats reads), and mode
+    'sample' instead records the call stack every interval seconds of CPU time, keeping folded stack -> number
+    of samples for flame graphs. Sampling is much lighter on slow puzzles but needs signal.setitimer (so Unix,
+    on the main thread), and misses puzzles that finish within an interval. Like SolveStats it's plain data,
+    so it can come back from a worker process and be merge()d with others."""
+
+    def __init__(self, mode='cprofile', interval=0.001):
+        if mode not in ('cprofile', 'sample'):
+            raise ValueError('unknown profiling mode: ' + str(mode))
+        if mode == 'sample':
+            import signal
+            if not hasattr(signal, 'setitimer'):
+                raise ValueError('sampling needs signal.setitimer, which this platform doesn\'t have')
+        self.mode = mode
+        self.interval = interval
+        self.puzzles = 0
+        self.elapsedNs = 0
+        self.phases = {}
+        self.running = None
+
+    def start(self, phase):
+        # profile from here to stop() as phase - the caller's frame is where the sampled stacks start
+        if self.mode == 'cprofile':
+            import cProfile
+            profiler = cProfile.Profile()
+            self.running = (phase, profiler, time.perf_counter_ns())
+            profiler.enable()
+            return
+
+        import signal
+        root = sys._getframe(1)
+        samples = self.phases.setdefault(phase, {})
+
+        def sample(signum, frame):
+            names = []
+            while frame is not None and frame is not root:
+                code = frame.f_code
+                names.append(code.co_name + ' (' + os.path.basename(code.co_filename) + ':' +
+                             str(code.co_firstlineno) + ')')
+                frame = frame.f_back
+            stack = ';'.join(reversed(names))
+            samples[stack] = samples.get(stack, 0) + 1
+
+        self.running = (phase, signal.signal(signal.SIGPROF, sample), time.perf_counter_ns())
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self):
+        phase, handle, start = self.running
+        self.running = None
+        if self.mode == 'cprofile':
+            handle.disable()
+            handle.create_stats()
+            self.addStats(phase, handle.stats)
+        else:
+            import signal
+            signal.setitimer(signal.ITIMER_PROF, 0)
+            signal.signal(signal.SIGPROF, handle)
+        self.elapsedNs += time.perf_counter_ns() - start
+
+    def addStats(self, phase, stats):
+        # fold raw cProfile stats into a phase, the way pstats.Stats.add() does
+        import pstats
+        mine = self.phases.setdefault(phase, {})
+        for function, counts in stats.items():
+            mine[function] = pstats.add_func_stats(mine[function], counts) if function in mine else counts
+
+    def merge(self, other):
+        self.puzzles += other.puzzles
+        self.elapsedNs += other.elapsedNs
+        for phase, found in other.phases.items():
+            if self.mode == 'cprofile':
+                self.addStats(phase, found)
+            else:
+                samples = self.phases.setdefault(phase, {})
+                for stack, count in found.items():
+                    samples[stack] = samples.get(stack, 0) + count
+        return self
+
+    def write(self, directory, name):
+        # cprofile: <name>.<phase>.pstats for each phase, to open with pstats or snakeviz
+        # sample: <name>.folded, "name;phase;outermost call;...;innermost call count" lines for flamegraph.pl
+        # or speedscope - name starts every stack, so files for different puzzles can be combined
+        if self.mode == 'cprofile':
+            import marshal
+            for phase, stats in self.phases.items():
+                with open(os.path.join(directory, name + '.' + phase + '.pstats'), 'wb') as f:
+                    marshal.dump(stats, f)
+            return
+
+        with open(os.path.join(directory, name + '.folded'), 'w') as f:
+            for phase, samples in self.phases.items():
+                for stack, count in sorted(samples.items()):
+                    f.write(';'.join(part for part in (name, phase, stack) if part) + ' ' + str(count) + '\n')
+
+
+class ProfileCollector(object):
+    """Gathers the PuzzleProfiles from a run of puzzles (see solveMany) into directory: they're all merged
+    into one written out as 'all' by close(), and with eachOverMs every puzzle that spent at least that many
+    milliseconds in the profiled phases is also written on its own as 'puzzle-<index>'."""
+
+    def __init__(self, directory, mode='cprofile', interval=0.001, eachOverMs=None):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.mode = mode
+        self.interval = interval
+        self.eachOverMs = eachOverMs
+        self.total = PuzzleProfile(mode, interval)
+
+    def newProfile(self):
+        return PuzzleProfile(self.mode, self.interval)
+
+    def add(self, index, profile):
+        self.total.merge(profile)
+        if self.eachOverMs is not None and profile.elapsedNs >= self.eachOverMs * 1e6:
+            profile.write(self.directory, 'puzzle-' + str(index))
+
+    def close(self):
+        if self.total.puzzles:
+            self.total.write(self.directory, 'all')
+
+
+def profileOptions(profiler):
+    # the solveLine arguments that have each puzzle profiled for profiler (a ProfileCollector or None)
+    if profiler is None:
+        return {}
+    return {'profileMode': profiler.mode, 'profileInterval': profiler.interval}
+
+
 ##################################################
 # FUNCTIONS
 ##################################################
 def parsePuzzle(site):
+    from urllib.request import urlopen
+
     response = urlopen(site)
     page_source = response.read()
 
@@ -34,125 +511,473 @@ def parsePuzzle(site):
     # find all groups of 81 digits in a row
     the3 = re.findall(r'\d{81}', str(page_source))
     # the3[0] = cheat, the3[1] = answer, the3[2] = clues
-
-    return the3[1], the3[2]
-
-def printPuzzle(valueList, solvedList='0'*81):
-    for i in range(9):
-        if i in [3, 6]:
-            print('-'*22)
+    if len(the3) < 3:
+        raise ValueError('no puzzle found on ' + site)
+
+    # any run of 81 digits matches, so make sure these really are a puzzle before anything tries to solve it
+    values, solved = the3[1], the3[2]
+    problem = BAD_CHARACTERS if '0' in values or solved.strip('01') else None
+    problem = problem or validatePuzzle(''.join(v if s == '0' else '0' for v, s in zip(values, solved)))
+    if problem is not None:
+        raise ValueError('the puzzle on ' + site + ': ' + problem)
+
+    return values, solved
+
+def splitPuzzle(puzzle):
+    # turn a puzzle ('0' or '.' for blanks) into the value/solved pair parsePuzzle returns - usually 81 characters,
+    # but 16, 256 and 625 character ones work the same way
+    valueList = ''
+    solvedList = ''
+    for char in puzzle:
+        if char in '0.':
+            valueList += '0'
+            solvedList += '1'
+        else:
+            valueList += char
+            solvedList += '0'
+
+    return valueList, solvedList
+
+def readPuzzles(source, useMmap=True):
+    # stream (puzzle, solution) pairs from a file path, '-' for stdin, or an open binary file, one puzzle per line
+    # a line is a puzzle (81 characters, or 16, 256 or 625 for other sizes, '0' or '.' for blanks), optionally
+    # followed by its solution after a space, comma, colon or tab - solution is None when there isn't one.
+    # Blank lines and '#' comments are skipped. Packed files (see PackedPuzzles) are read too.
+    # files are memory-mapped where possible so even huge corpora are never held in memory at once
+    closeAfter = []
+    if source == '-':
+        lines = sys.stdin.buffer
+    elif isinstance(source, str):
+        handle = open(source, 'rb')
+        if handle.read(len(packedMagic)) == packedMagic:
+            handle.close()
+            with PackedPuzzles(source) as packed:
+                for pair in packed:
+                    yield pair
+            return
+        handle.seek(0)
+        closeAfter.append(handle)
+        lines = handle
+        if useMmap:
+            try:
+                mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, OSError):
+                pass  # empty files and pipes can't be mapped, so just read them normally
+            else:
+                closeAfter.append(mapped)
+                lines = iter(mapped.readline, b'')
+    else:
+        lines = source
+
+    try:
+        for line in lines:
+            fields = line.replace(b',', b' ').replace(b':', b' ').split()
+            if not fields or fields[0].startswith(b'#'):
+                continue
+            solution = fields[1].decode('ascii') if len(fields) > 1 else None
+            yield fields[0].decode('ascii'), solution
+    finally:
+        for closeable in reversed(closeAfter):
+            closeable.close()
+
+def writeLines(lines, target='-', bufferSize=1 << 20):
+    # write an iterable of result lines to a path (or '-' for stdout) through one large buffer
+    if target == '-':
+        stream = open(sys.stdout.fileno(), 'w', buffering=bufferSize, closefd=False)
+    else:
+        stream = open(target, 'w', buffering=bufferSize)
+
+    with stream:
+        for line in lines:
+            stream.write(line)
+            stream.write('\n')
+
+def printPuzzle(valueList, solvedList=None):
+    # works for any board size - bigger boards are written with letters, so every value is still one character
+    boxSize = geometryFor(len(valueList)).boxSize
+    size = boxSize * boxSize
+    for i in range(size):
+        if i and not i % boxSize:
+            print('-' * (2 * size + 2 * (boxSize - 1)))
         lineVals = ''
-        for j in range(9):
-            if j in [3, 6]:
+        for j in range(size):
+            if j and not j % boxSize:
                 lineVals += '| '
-            index = (i * 9) + j
-            if not int(solvedList[index]):
+            index = (i * size) + j
+            if solvedList is None or not int(solvedList[index]):
                 lineVals += valueList[index]+' '
             else:
                 lineVals += '0 '
         print(lineVals)
 
 
-def solvePuzzle(valueList, solvedList):
-
-    print(valueList)
-    print(solvedList)
-    sudokuList = []
+def solvePuzzle(valueList, solvedList, maxNodes=None, maxTime=None, maxDepth=None, backend='strategies', stats=None,
+                profile=None, table=None):
+    # backend is 'strategies' (deduce what we can, then guess) or 'dlx' (exact cover search)
+    # pass a SolveStats as stats to have it count what each strategy and phase did,
+    # and a PuzzleProfile as profile to have PART 1 and PART 2 profiled into it
+    # a TranspositionTable as table has the strategies backend's guessing remember what it counted, for a later
+    # countSolutions or isUnique of the same puzzle to reuse
+    # the board size comes from the length of the lists - anything but 9x9 needs the strategies backend
+    # valueList can also be a sequence of ints (e.g. PackedPuzzles.values()), and then solvedList can be None
+    if backend not in ('strategies', 'dlx'):
+        raise ValueError('unknown backend: ' + str(backend))
+    geometry = geometryFor(len(valueList))
+    if backend == 'dlx' and geometry is not standardGeometry:
+        raise ValueError('the dlx backend only solves 9x9 boards')
+
+    if stats is not None:
+        stats.puzzles += 1
+        start = time.perf_counter_ns()
+    if profile is not None:
+        profile.puzzles += 1
+
+    if summarySink is not None:
+        summarySink(TraceEvent('start', None, valueList, solvedList))
 
     # convert the lists to ints
-    temp1 = []
-    temp2 = []
-    for i in range(81):
-        temp1.append(int(valueList[i]))
-        temp2.append(int(solvedList[i]))
+    if isinstance(valueList, str):
+        temp1 = geometry.valuesOf(valueList)
+    else:
+        temp1 = list(valueList)
+    if solvedList is None:
+        temp2 = [0 if value else 1 for value in temp1]
+    else:
+        temp2 = [int(flag) for flag in solvedList]
     valueList = temp1
     solvedList = temp2
     del temp1, temp2
 
-    # fill starting matrix/list with known values
-    for i in range(81):
-        if solvedList[i]:
-            sudokuList.append([0, [], i])
-            # create a list of values 1-9 for each location on the grid
-            for j in range(1, 10):
-                sudokuList[i][1].append(j)
-        else:
-            sudokuList.append([valueList[i], [], i])
+    if backend == 'dlx':
+        if stats is not None:
+            stats.countPhase('setup', time.perf_counter_ns() - start)
+            start = time.perf_counter_ns()
+
+        if profile is not None:
+            profile.start('search')
+        result, values = dancingLinks(valueList, solvedList, maxNodes, maxTime, maxDepth)
+        if profile is not None:
+            profile.stop()
 
-    # list of block indices
-    block0 = [0, 9, 18, 1, 10, 19, 2, 11, 20]
-    block1 = [x + 3 for x in block0]
-    block2 = [x + 3 for x in block1]
-    block3 = [x + 27 for x in block0]
-    block4 = [x + 27 for x in block1]
-    block5 = [x + 27 for x in block2]
-    block6 = [x + 27*2 for x in block0]
-    block7 = [x + 27*2 for x in block1]
-    block8 = [x + 27*2 for x in block2]
-    allBlocks = [block0, block1, block2, block3, block4, block5, block6, block7, block8]
+        if stats is not None:
+            stats.countPhase('search', time.perf_counter_ns() - start)
+            stats.countSearch(result)
+
+        finalList = ''
+        for i in range(81):
+            finalList += str(values[i])
+
+        if summarySink is not None:
+            summarySink(TraceEvent('search', None, result.status, result))
+            summarySink(TraceEvent('finish', None, finalList, None))
+
+        return finalList
+
+    # fill starting board with known values - every other location starts with all 9 possibilities
+    sudokuList = SudokuBoard(geometry)
+    sudokuList.stats = stats
+    possible = True
+    for i in range(geometry.cells):
+        if not solvedList[i]:
+            possible = placeValue(sudokuList, solvedList, i, valueList[i]) and possible
+    problem = None if possible else REPEATED_GIVEN
+    givenMark = len(sudokuList.trail)
+
+    if stats is not None:
+        stats.countPhase('setup', time.perf_counter_ns() - start)
+        start = time.perf_counter_ns()
 
 
     ####################################################
     # PART 1 - no guessing
     ####################################################
 
-    # keep looping until we solve the puzzle - set max loops
-    loops = 10
-    while loops and 1 in solvedList:
-        loops -= 1
-
-        solveLocation1(sudokuList, solvedList)
-        removePossibilities1(sudokuList, solvedList)
-        solveLocation2(sudokuList, solvedList)
-        solveLocation1(sudokuList, solvedList)
-        removePossibilities2(sudokuList, solvedList, allBlocks)
-        solveLocation2(sudokuList, solvedList)
-        solveLocation1(sudokuList, solvedList)
-        removePossibilities3(sudokuList, solvedList, allBlocks)
-        solveLocation2(sudokuList, solvedList)
+    # spread the known values until nothing else can be deduced
+    if profile is not None:
+        profile.start('propagation')
+    if possible and not deduce(sudokuList, solvedList):
+        possible = False
+        problem = boardProblem(sudokuList)
+    if profile is not None:
+        profile.stop()
+
+    # a board that contradicts itself already is never searched - it goes back as it was given, rather than
+    # with whatever got placed before the contradiction turned up (or without a given that clashed)
+    if problem is not None:
+        if stats is not None:
+            stats.countRejection(problem)
+        if summarySink is not None:
+            summarySink(TraceEvent('reject', None, problem, None))
+        undoChanges(sudokuList, solvedList, givenMark)
+
+    if stats is not None:
+        stats.countPhase('propagation', time.perf_counter_ns() - start)
+        start = time.perf_counter_ns()
 
     ####################################################
     # PART 2 - guessing (aka "Magic")
     ####################################################
     # check to see if it's solved already
-    if 1 in solvedList:
-        # otherwise sort any unguessed nodes by the number of their possibilities
-        guessList = sorted(sudokuList, key=lambda x: len(x[1]))
-
-        # and guess the values
-        sudokuList, solvedList, guessList = guessValues(sudokuList, solvedList, guessList, allBlocks)
-
+    if possible and 1 in solvedList:
+        # otherwise guess the values - a dead end or running out of budget leaves the board as it was
+        if profile is not None:
+            profile.start('search')
+        result = guessValues(sudokuList, solvedList, maxNodes, maxTime, maxDepth, table=table)
+        if profile is not None:
+            profile.stop()
+        if stats is not None:
+            stats.countPhase('search', time.perf_counter_ns() - start)
+            stats.countSearch(result)
+        if summarySink is not None:
+            summarySink(TraceEvent('search', None, result.status, result))
+
+
+    if problem is None:
+        values = sudokuList.values
+    else:
+        values = [0 if flag else value for value, flag in zip(valueList, solvedList)]
 
     finalList = ''
     newList = ''
-    for i in range(81):
-        finalList += str(sudokuList[i][0])
+    symbols = geometry.symbols
+    for i in range(geometry.cells):
+        finalList += symbols[values[i]]
         newList += str(solvedList[i])
 
-    print(finalList)
-    print(newList)
-
-    solvedList2 = ''
-    for abc in range(81):
-        solvedList2 += str(len(sudokuList[abc][1]))
-    print(solvedList2)
+    if summarySink is not None:
+        summarySink(TraceEvent('finish', None, finalList, newList))
 
     return finalList
 
 
-def solveLocation1(sudokuList, solvedList):
+def boardProblem(sudokuList):
+    # why a board deduce() gave up on contradicts itself: a location with nothing left that its units allow,
+    # or else a unit with nowhere left to put one of its values
+    geometry = sudokuList.geometry
+    values = sudokuList.values
+    masks = sudokuList.masks
+    unitMasks = sudokuList.unitMasks
+    unitIdsOf = geometry.unitIdsOf
+
+    # deduce() stops at the first conflict, so a location's mask can still hold values placed in its units since
+    allowed = [0] * geometry.cells
+    for i in range(geometry.cells):
+        if not values[i]:
+            row, col, block = unitIdsOf[i]
+            allowed[i] = masks[i] & ~(unitMasks[row] | unitMasks[col] | unitMasks[block])
+            if not allowed[i]:
+                return NO_CANDIDATES
+
+    for u, unit in enumerate(geometry.allUnits):
+        found = unitMasks[u]
+        for i in unit:
+            found |= allowed[i]
+        if found != geometry.allDigits:
+            return MISSING_VALUE
+
+    # the strategy passes can rule a board out for other reasons (e.g. three locations sharing two values)
+    return CONTRADICTION
+
+
+def countSolutions(puzzle, limit=2, maxNodes=None, maxTime=None, stats=None, table=None):
+    # count a puzzle's solutions, stopping as soon as there are limit of them
+    # returns the count (at most limit), or None if the budget ran out before it could tell
+    # a TranspositionTable shared between calls lets later counts reuse what earlier ones found
+    if stats is not None:
+        stats.puzzles += 1
+
+    sudokuList, solvedList = newBoard(puzzle, stats)
+    if sudokuList is None or not deduce(sudokuList, solvedList):
+        return 0
+
+    result = guessValues(sudokuList, solvedList, maxNodes, maxTime, None, limit, table)
+    if stats is not None:
+        stats.countSearch(result)
+    if result.status == BUDGET_EXCEEDED:
+        return None
+    return result.solutions
+
+
+def newBoard(puzzle, stats=None):
+    # a board and solved list with a puzzle's givens placed, or (None, None) if two of them clash
+    # raises ValueError for a puzzle of the wrong length or with characters that aren't values or blanks
+    geometry = geometryFor(len(puzzle))
+    valueList = geometry.valuesOf(puzzle)
+    solvedList = [0 if value else 1 for value in valueList]
+    sudokuList = SudokuBoard(geometry)
+    sudokuList.stats = stats
+    for i in range(geometry.cells):
+        if not solvedList[i] and not placeValue(sudokuList, solvedList, i, valueList[i]):
+            return None, None
+
+    return sudokuList, solvedList
+
+
+def isUnique(puzzle, maxNodes=None, maxTime=None, table=None):
+    # True if the puzzle has exactly one solution, or None if the budget ran out before it could tell
+    count = countSolutions(puzzle, 2, maxNodes, maxTime, table=table)
+    return None if count is None else count == 1
+
+
+def placeValue(sudokuList, solvedList, i, value, status=0):
+    # fill in the location and record the value in the masks of its row, column and 3x3 block
+    unitMasks = sudokuList.unitMasks
+    row, col, block = sudokuList.geometry.unitIdsOf[i]
+    bit = sudokuList.geometry.digitBit[value]
+
+    # the location is already filled or the value is already used nearby, so it can't go here
+    if sudokuList.values[i] or (unitMasks[row] | unitMasks[col] | unitMasks[block]) & bit:
+        return False
+
+    sudokuList.trail.append((i, sudokuList.masks[i], True))
+    sudokuList.values[i] = value
+    sudokuList.masks[i] = 0
+    unitMasks[row] |= bit
+    unitMasks[col] |= bit
+    unitMasks[block] |= bit
+    solvedList[i] = status
+
+    # queue it so propagate() can clear the value from its peers and re-check its units
+    sudokuList.placed.append(i)
+    sudokuList.changed.append(i)
+    return True
+
+
+def removePossibility(sudokuList, i, bit):
+    # drop a possibility from the location and queue it to be re-checked
+    sudokuList.trail.append((i, sudokuList.masks[i], False))
+    sudokuList.masks[i] &= ~bit
+    sudokuList.changed.append(i)
+
+
+def undoChanges(sudokuList, solvedList, mark):
+    # roll the board back to how it was when the trail was mark entries long
+    values = sudokuList.values
+    masks = sudokuList.masks
+    unitMasks = sudokuList.unitMasks
+    trail = sudokuList.trail
+    digitBit = sudokuList.geometry.digitBit
+    unitIdsOf = sudokuList.geometry.unitIdsOf
+
+    while len(trail) > mark:
+        i, mask, placed = trail.pop()
+        if placed:
+            # take the value back out of its row, column and 3x3 block
+            notBit = ~digitBit[values[i]]
+            for u in unitIdsOf[i]:
+                unitMasks[u] &= notBit
+            values[i] = 0
+            solvedList[i] = 1
+        masks[i] = mask
+
+    # anything still queued belonged to the abandoned branch
+    sudokuList.placed = []
+    sudokuList.changed = []
+
+
+def runStrategy(sudokuList, solvedList, strategy, *args):
+    # call a strategy, tallying its placements, eliminations and time if the board is collecting stats
+    stats = sudokuList.stats
+    if stats is None:
+        return strategy(sudokuList, solvedList, *args)
+
+    trail = sudokuList.trail
+    mark = len(trail)
+    start = time.perf_counter_ns()
+    result = strategy(sudokuList, solvedList, *args)
+    nanoseconds = time.perf_counter_ns() - start
+
+    # every change lands on the trail, flagged if it was a placement
+    placements = 0
+    for entry in islice(trail, mark, None):
+        placements += entry[2]
+    stats.countStrategy(strategy.__name__, placements, len(trail) - mark - placements, nanoseconds)
+    return result
+
+
+def deduce(sudokuList, solvedList, passes=None):
+    # everything short of guessing: propagate, then try the strategy passes in order (deductionPasses unless
+    # told otherwise) - as soon as one finds something, propagate and start again from the first,
+    # until none of them finds anything new
+    # returns False if the board turned out to be impossible
+    if passes is None:
+        passes = deductionPasses
+        if passes is None:
+            passes = defaultPasses[sudokuList.geometry is standardGeometry]
+    possible = propagate(sudokuList, solvedList)
+    while possible and 1 in solvedList:
+
+        for name in passes:
+            possible = runStrategy(sudokuList, solvedList, strategyPasses[name])
+            if not possible or sudokuList.placed or sudokuList.changed:
+                break
+        else:
+            # nothing new anywhere, so we're stuck
+            break
+
+        possible = possible and propagate(sudokuList, solvedList)
+
+    return possible
+
+
+def propagate(sudokuList, solvedList):
+    # keep expanding whatever was filled in or lost possibilities until nothing new turns up
+    # returns False as soon as the board contradicts itself
+    stats = sudokuList.stats
+    while sudokuList.placed or sudokuList.changed:
+        if stats is not None:
+            stats.propagationPasses += 1
+
+        # clear the newly placed values from their peers
+        placed = sudokuList.placed
+        sudokuList.placed = []
+        if placed and not runStrategy(sudokuList, solvedList, removePossibilities1, placed):
+            return False
+
+        # re-check only the locations that changed, and the units they belong to
+        changed = sudokuList.changed
+        sudokuList.changed = []
+        if changed:
+            if not runStrategy(sudokuList, solvedList, solveLocation1, changed):
+                return False
+
+            unitIds = set()
+            unitIdsOf = sudokuList.geometry.unitIdsOf
+            for i in changed:
+                unitIds.update(unitIdsOf[i])
+            if not runStrategy(sudokuList, solvedList, solveLocation2, unitIds):
+                return False
+
+    return True
+
+
+def solveLocation1(sudokuList, solvedList, indices=None):
+    values = sudokuList.values
+    masks = sudokuList.masks
+    bitCount = sudokuList.geometry.bitCount
+    bitValue = sudokuList.geometry.bitValue
+    sink = stepSink
+    if indices is None:
+        indices = range(sudokuList.geometry.cells)
+
     # go through each location
-    for i in range(81):
+    for i in indices:
 
         # if there's only 1 possibility left for that location, solve it
-        if len(sudokuList[i][1]) == 1:
-            print('solving index ' + str(i) + ' - only 1 possibility left')
-            solvedList[i] = 0
-            sudokuList[i][0] = sudokuList[i][1][0]
-            sudokuList[i][1].pop()
+        if bitCount[masks[i]] == 1:
+            if sink is not None:
+                sink(TraceEvent('solve', i, bitValue[masks[i]], 'only 1 possibility left'))
+            if not placeValue(sudokuList, solvedList, i, bitValue[masks[i]]):
+                return False
+
+        # if there are no possibilities left for an unsolved location, the board is broken
+        elif not masks[i] and not values[i]:
+            return False
+
+    return True
 
 
-def solveLocation2(sudokuList, solvedList):
+def solveLocation2(sudokuList, solvedList, unitIds=None):
     #######################################################
     # check to see if 2 out of 3 row blocks have a value AND the 3rd block has 2 out of 3 values solved in that row
     #######################################################
@@ -164,159 +989,86 @@ def solveLocation2(sudokuList, solvedList):
     the top left 1 and bottom right 1 mean the middle row of middle block must contain a 1
     and since 2 out of 3 of those values are solved (0 2 3), we know the 3rd must be a 1
     """
-    # easiest way to do this is simply to check if each location has a 'unique possibility'
-    for i in range(81):
-
-        earlyBreak = False
-
-        #######################################################
-        # check rows for unique possibilities
-        #######################################################
-        if solvedList[i]:
-            for j in range(len(sudokuList[i][1])):
-                counter = 0
-
-                # go through each column of the current row
-                for r in range(9):
-                    indexA = int(i / 9) * 9 + r
-
-                    # this shouldn't happen, but adding it in to be safe - make sure the value isn't already solved
-                    if sudokuList[i][1][j] == sudokuList[indexA][0]:
-                        #print('removing possibility ' + str(sudokuList[indexA][0]) + ' from ' + str(sudokuList[i]) + ' at index ' + str(i))
-                        sudokuList[i][1].pop(j)
-                        earlyBreak = True
-                        break
-
-                    # count up each time that possibility is found
-                    if sudokuList[i][1][j] in sudokuList[indexA][1]:
-                        # print(str(sudokuList[i][1][j] in sudokuList[indexA][1]))
-                        counter += 1
-
-                if earlyBreak:
-                    break
-
-                # if only one possibility was found, we know it was in the current cell, so solve it
-                if counter == 1:
-                    print('solving index '+str(i)+' - the row has no similar possibilities')
-                    solvedList[i] = 0
-                    sudokuList[i][0] = sudokuList[i][1][j]
-                    sudokuList[i][1] = []
-                    break
-
-        #######################################################
-        # check columns for unique possibilities
-        #######################################################
-        if solvedList[i]:  # check again, because it may have just been solved above
-            for j in range(len(sudokuList[i][1])):
-                counter = 0
-
-                # go through each column of the current row
-                for c in range(9):
-                    indexB = (i % 9) + (9 * c)
-
-                    # this shouldn't happen, but adding it in to be safe - make sure the value isn't already solved
-                    if sudokuList[i][1][j] == sudokuList[indexB][0]:
-                        #print('removing possibility ' + str(sudokuList[indexB][0]) + ' from ' + str(sudokuList[i]) + ' at index ' + str(i))
-                        sudokuList[i][1].pop(j)
-                        earlyBreak = True
-                        break
-
-                    # count up each time that possibility is found
-                    if sudokuList[i][1][j] in sudokuList[indexB][1]:
-                        counter += 1
-
-                if earlyBreak:
-                    break
-
-                # if only one possibility was found, we know it was in the current cell, so solve it
-                if counter == 1:
-                    print('solving index '+str(i)+' - the column has no similar possibilities')
-                    solvedList[i] = 0
-                    sudokuList[i][0] = sudokuList[i][1][j]
-                    sudokuList[i][1] = []
+    # easiest way to do this is simply to check if each unit has a 'unique possibility'
+    masks = sudokuList.masks
+    unitMasks = sudokuList.unitMasks
+    allUnits = sudokuList.geometry.allUnits
+    allDigits = sudokuList.geometry.allDigits
+    bitValue = sudokuList.geometry.bitValue
+    sink = stepSink
+    if unitIds is None:
+        unitIds = range(len(allUnits))
+
+    for u in unitIds:
+        unit = allUnits[u]
+
+        # find the possibilities that show up once in the unit, and the ones that show up more than once
+        once = 0
+        twice = 0
+        for index in unit:
+            twice |= once & masks[index]
+            once |= masks[index]
+
+        # every value has to go somewhere in the unit
+        if (once | unitMasks[u]) != allDigits:
+            return False
+
+        # if a possibility wasn't found anywhere else (and isn't solved yet), we know which cell it belongs in
+        unique = once & ~twice & ~unitMasks[u]
+        while unique:
+            bit = unique & -unique
+            unique ^= bit
+            for index in unit:
+                if masks[index] & bit:
+                    if sink is not None:
+                        sink(TraceEvent('solve', index, bitValue[bit],
+                                        'the ' + sudokuList.geometry.unitNames[u] + ' has no similar possibilities'))
+                    if not placeValue(sudokuList, solvedList, index, bitValue[bit]):
+                        return False
                     break
 
-        #######################################################
-        # check 3x3 blocks for unique possibilities
-        #######################################################
-        if solvedList[i]:  # check again, because it may have just been solved above
-            for j in range(len(sudokuList[i][1])):
-                counter = 0
-
-                # go through each column of the current row
-                for u in range(3):
-                    for v in range(3):
-                        # go through each index of current 3x3 block
-                        indexC = ((int(i / 3) * 3 + u) % 9) + (9 * v) + (int(i / 27) * 27)
-
-                        # this shouldn't happen, but adding it in to be safe - make sure the value isn't already solved
-                        if sudokuList[i][1][j] == sudokuList[indexC][0]:
-                            #print('removing possibility ' + str(sudokuList[indexC][0]) + ' from ' + str(sudokuList[i]) + ' at index ' + str(i))
-                            sudokuList[i][1].pop(j)
-                            earlyBreak = True
-                            break
-
-                        # count up each time that possibility is found
-                        if sudokuList[i][1][j] in sudokuList[indexC][1]:
-                            counter += 1
-
-                    if earlyBreak:
-                        break
+    return True
 
-                if earlyBreak:
-                    break
 
-                # if only one possibility was found, we know it was in the current cell, so solve it
-                if counter == 1:
-                    print('solving index '+str(i)+' - the 3x3 block has no similar possibilities')
-                    solvedList[i] = 0
-                    sudokuList[i][0] = sudokuList[i][1][j]
-                    sudokuList[i][1] = []
-                    break
+def removePossibilities1(sudokuList, solvedList, placed=None):
+    values = sudokuList.values
+    masks = sudokuList.masks
+    changed = sudokuList.changed
+    trail = sudokuList.trail
+    digitBit = sudokuList.geometry.digitBit
+    peerList = sudokuList.geometry.peerList
 
+    # expand every solved value unless we're told which ones are new
+    if placed is None:
+        placed = [i for i in range(sudokuList.geometry.cells) if values[i]]
 
-def removePossibilities1(sudokuList, solvedList):
-    # go through each location
-    for i in range(81):
+    for i in placed:
 
         ########################################
-        # expand each solved value
+        # eliminate the value from the row, column and 3x3 block
         ########################################
-        # if solvedList[i] is 0, it means it is solved, so it can be expanded
-        if not solvedList[i]:
-
-            #######################################################
-            # check rows to eliminate possibilities
-            #######################################################
-            for r in range(9):
-                # go through each column of the current row
-                indexA = int(i/9)*9 + r
-                # pop that value from the list
-                if sudokuList[i][0] in sudokuList[indexA][1]:
-                    sudokuList[indexA][1].pop(sudokuList[indexA][1].index(sudokuList[i][0]))
+        bit = digitBit[values[i]]
+        for index in peerList[i]:
+            if masks[index] & bit:
+                # same as removePossibility(), inlined since this is the busiest loop
+                trail.append((index, masks[index], False))
+                masks[index] &= ~bit
+                changed.append(index)
+
+                # an unsolved location with no possibilities left means the board is broken
+                if not masks[index]:
+                    return False
 
-            #######################################################
-            # check columns to eliminate possibilities
-            #######################################################
-            for s in range(9):
-                # go through each row of the current column
-                indexB = (i % 9) + (9 * s)
-                # pop that value from the list
-                if sudokuList[i][0] in sudokuList[indexB][1]:
-                    sudokuList[indexB][1].pop(sudokuList[indexB][1].index(sudokuList[i][0]))
+    return True
 
-            #######################################################
-            # check 3x3 sections to eliminate possibilities
-            #######################################################
-            for u in range(3):
-                for v in range(3):
-                    # go through each index of current 3x3 block
-                    indexC = ((int(i / 3) * 3 + u) % 9) + (9 * v) + (int(i / 27) * 27)
-                    if sudokuList[i][0] in sudokuList[indexC][1]:
-                        sudokuList[indexC][1].pop(sudokuList[indexC][1].index(sudokuList[i][0]))
 
+def removePossibilities2(sudokuList, solvedList):
+    # written for 3x3 blocks, so other board sizes get nothing out of it
+    if sudokuList.geometry is not standardGeometry:
+        return True
+    masks = sudokuList.masks
+    sink = stepSink
 
-def removePossibilities2(sudokuList, solvedList, allBlocks):
     # try some more eliminations
     for i in range(81):
 
@@ -334,103 +1086,72 @@ def removePossibilities2(sudokuList, solvedList, allBlocks):
             the top right 1 must belong somewhere in 2 3 4 5 6 0 of the middle block, and since 5 out of 6
             of them are solved in that middle block, we know the 1 must belong in the 6th spot
             """
-            # first find block it belongs to
-            blockNum = 0
-            for aa in allBlocks:
-                if i in aa:
-                    block = aa
-                    break
-                blockNum += 1
+            blockNum = blockOf[i]
+            value = sudokuList.values[i]
+            bit = digitBit[value]
 
-            # find the 3 blocks in the row
-            firstBlock = int(blockNum / 3) * 3
-            rowBlocks = [firstBlock, firstBlock + 1, firstBlock + 2]
-            location = blockNum % 3
-            rowBlocks.pop(location)
-
-            # isolate the row i is on
-            row = int((i % 27) / 9)
+            # isolate the row of the block that i is on
+            row = rowOf[i] % 3
 
             # check each adjacent block in the row
-            for bb in rowBlocks:
-                counter = 0
+            for bb in bandBlocks[blockNum]:
+                # make sure the value doesn't already exist in the block
+                if sudokuList.unitMasks[18 + bb] & bit:
+                    continue
+
+                # collect the unsolved locations that aren't on the same row
                 theSix = []
-                # store the solved numbers in the current block
-                blockVals = []
-                for dd in allBlocks[bb]:
-                    blockVals.append(sudokuList[dd][0])
-
-                # check each value in that block
-                for cc in allBlocks[bb]:
-                    # if not on the same row, add up solved values
-                    if int((cc % 27) / 9) != row:
-                        theSix.append(cc)
-                        # if solvedList[cc] is solved (has a 0)
-                        if not solvedList[cc]:
-                            counter += 1
-                    # if the total count is 5, we can solve the 6th
-                    if counter == 5:
-                        for x in theSix:
-                            # find the index that's unsolved and make sure the value doesn't already exist in the block
-                            if solvedList[x]:
-                                if sudokuList[i][0] not in blockVals:
-                                    # replace the unknown with sudokuList[i] and update solvedList
-                                    print('solving index ' + str(x) + ' - 5 out of 6 knowns in adjacent row blocks')
-                                    sudokuList[x] = sudokuList[i]
-                                    solvedList[x] = 0
+                for k in range(3):
+                    if k != row:
+                        for cc in blockRowCells[bb][k]:
+                            if solvedList[cc]:
+                                theSix.append(cc)
+
+                # if 5 out of 6 are solved, we can solve the 6th
+                if len(theSix) == 1 and masks[theSix[0]] & bit:
+                    if sink is not None:
+                        sink(TraceEvent('solve', theSix[0], value, '5 out of 6 knowns in adjacent row blocks'))
+                    if not placeValue(sudokuList, solvedList, theSix[0], value):
+                        return False
 
 
             #######################################################
-            # check to see if 5 out of 6 values in adjacent block rows are solved
+            # check to see if 5 out of 6 values in adjacent block columns are solved
             #######################################################
-            # NOTE: blockNum was determined above and can be used again below
+            # isolate the column of the block that i is on
+            col = colOf[i] % 3
+
+            # check each adjacent block in the column
+            for bb in stackBlocks[blockNum]:
+                # make sure the value doesn't already exist in the block
+                if sudokuList.unitMasks[18 + bb] & bit:
+                    continue
+
+                # collect the unsolved locations that aren't on the same column
+                theSix = []
+                for k in range(3):
+                    if k != col:
+                        for cc in blockColCells[bb][k]:
+                            if solvedList[cc]:
+                                theSix.append(cc)
+
+                # if 5 out of 6 are solved, we can solve the 6th
+                if len(theSix) == 1 and masks[theSix[0]] & bit:
+                    if sink is not None:
+                        sink(TraceEvent('solve', theSix[0], value, '5 out of 6 knowns in adjacent column blocks'))
+                    if not placeValue(sudokuList, solvedList, theSix[0], value):
+                        return False
 
-            # find the 3 blocks in the column
-            firstBlock = blockNum % 3
-            colBlocks = [firstBlock, firstBlock + 3, firstBlock + 6]
-            location = int(blockNum / 3)
-            colBlocks.pop(location)
+    return True
 
-            # store the solved numbers in the current block
-            blockVals = []
-            for aa in block:
-                blockVals.append(sudokuList[aa])
 
-            # isolate the column i is on
-            col = i % 3
+def removePossibilities3(sudokuList, solvedList):
+    # written for 3x3 blocks, so other board sizes get nothing out of it
+    if sudokuList.geometry is not standardGeometry:
+        return True
+    values = sudokuList.values
+    masks = sudokuList.masks
 
-            # check each adjacent block in the row
-            for bb in colBlocks:
-                counter = 0
-                theSix = []
-                # store the solved numbers in the current block
-                blockVals = []
-                for dd in block:
-                    blockVals.append(sudokuList[dd][0])
-
-                # check each value in that block
-                for cc in allBlocks[bb]:
-                    # if not on the same row, add up solved values
-                    if cc % 3 != col:
-                        theSix.append(cc)
-                        # if solvedList[cc] is solved (has a 0)
-                        if not solvedList[cc]:
-                            counter += 1
-                    # if the total count is 5, we can solve the 6th
-                    if counter == 5:
-                        #print('theSix for ' + str(i) + ' are ' + str(theSix))
-                        for x in theSix:
-                            # find the index that's unsolved and make sure the value doesn't already exist in the block
-                            if solvedList[x]:
-                                #print(str(x)+' needs to be solved')
-                                if sudokuList[i][0] not in blockVals:
-                                    # replace the unknown with sudokuList[i] and update solvedList
-                                    print('solving index ' + str(x) + ' - 5 out of 6 knowns in adjacent column blocks')
-                                    sudokuList[x] = sudokuList[i]
-                                    solvedList[x] = 0
-
-
-def removePossibilities3(sudokuList, solvedList, allBlocks):
     # check all locations
     for i in range(81):
 
@@ -447,210 +1168,591 @@ def removePossibilities3(sudokuList, solvedList, allBlocks):
             0 0 0 | 0 0 0 | 0 0 0
             the top left 1 and the middle 2 3 4 means we can eliminate 1 from the bottom right 3 nodes
             """
-            # first find block it belongs to
-            blockNum = 0
-            for block in allBlocks:
-                if i in block:
-                    break
-                blockNum += 1
+            blockNum = blockOf[i]
+            value = values[i]
+            bit = digitBit[value]
 
-            # find the 3 blocks in the row
-            firstBlock = int(blockNum / 3) * 3
-            # print(firstBlock)
-            rowBlocks = [firstBlock, firstBlock + 1, firstBlock + 2]  # blocks [0,1,2] or [3,4,5] or [6,7,8]
-            location = blockNum % 3  # get index of current block to pop out of rowBlocks below
-            rowBlocks.pop(location)
-
-            # isolate the row i is on
-            row = int((i % 27) / 9)
-            # print(str(i)+' is in row '+str(row))
+            # isolate the row of the block that i is on
+            row = rowOf[i] % 3
+            rowBlocks = bandBlocks[blockNum]
 
             # check each adjacent block in the row
             for rowBlockNum in rowBlocks:
-                theThree = [[], [], []]
-
-                # check each value in that block
-                for threeIndex in allBlocks[rowBlockNum]:
-                    # if not on the same row, add the index to the appropriate list
-                    diffRow = int((threeIndex % 27) / 9)
-                    if diffRow != row:
-                        theThree[diffRow].append(threeIndex)
+                for eachRow in range(3):
+                    if eachRow == row:
+                        continue
 
-                for eachThree in range(len(theThree)):
+                    # count the solved locations on that row of the block that don't hold the value
                     counter = 0
-                    if theThree[eachThree]:  # because one will be an empty list
-                        for threeIndex in theThree[eachThree]:
-                            # if solvedList[threeIndex] is solved (has a 0)
-                            # bugfix: make sure sudokuList[i][0] isn't in theThree indices
-                            if not solvedList[threeIndex] and sudokuList[i][0] != sudokuList[threeIndex][0]:
-                                counter += 1
+                    for threeIndex in blockRowCells[rowBlockNum][eachRow]:
+                        if not solvedList[threeIndex] and values[threeIndex] != value:
+                            counter += 1
 
+                    # if the whole row is solved, the value must be on the block's last row,
+                    # so we can eliminate it from that row of the last rowBlock
                     if counter == 3:
-                        temp = rowBlocks[:]  # NOTE: need [:] to make a copy, otherwise python will just make another reference for the same object...
-                        temp.remove(rowBlockNum)
-                        lastBlock = temp.pop(0)
-                        #print('lastBlock is '+str(lastBlock))
-                        temp = [0, 1, 2]
-                        temp.remove(row)
-                        temp.remove(int((threeIndex % 27) / 9))
-                        lastRow = temp.pop(0)
-                        startIndex = allBlocks[lastBlock][lastRow]  # takes index 0,1, or 2 because the lastBlock row order is [0,1,2...]
-
-                        for k in [0,1,2]:
-                            #print('sudokuList[startIndex+k] is ' + str(sudokuList[startIndex + k]))
-                            try:
-                                sudokuList[startIndex+k][1].remove(sudokuList[i][0])
-                                #print('removed possibility of ' + str(sudokuList[i][0]) + ' from index ' + str(startIndex+k))
-                            except:
-                                #print('failed to remove possibility of ' + str(sudokuList[i][0]) + ' from index ' + str(startIndex+k))
-                                pass
+                        lastBlock = rowBlocks[0] if rowBlocks[1] == rowBlockNum else rowBlocks[1]
+                        lastRow = 3 - row - eachRow  # rows are 0, 1 and 2 so the missing one is 3 minus the others
+                        for k in blockRowCells[lastBlock][lastRow]:
+                            if masks[k] & bit:
+                                removePossibility(sudokuList, k, bit)
 
 
             #######################################################
             # check column of 3x3 sections to remove possibilities
             #######################################################
-            # find the 3 blocks in the column
-            firstBlock = blockNum % 3
-            colBlocks = [firstBlock, firstBlock + 3, firstBlock + 6]  # blocks [0,3,6] or [1,4,7] or [2,5,8]
-            location = int(blockNum / 3)  # get index of current block to pop out of colBlocks below
-            colBlocks.pop(location)
-            #print('other blocks in col are '+str(colBlocks))
-
-            # isolate the column i is on: 0, 1, or 2
-            col = i % 3
-            #print(str(i)+' is in column '+str(col))
-            for block in colBlocks:
-                theThree = [[], [], []]
+            # isolate the column of the block that i is on: 0, 1, or 2
+            col = colOf[i] % 3
+            colBlocks = stackBlocks[blockNum]
 
-                # check each value in that block
-                for threeIndex in allBlocks[block]:
-                    # if not on the same row, add to the appropriate list
-                    diffCol = threeIndex % 3
-                    if diffCol != col:
-                        theThree[diffCol].append(threeIndex)
-                        # print(theThree)
+            # check each adjacent block in the column
+            for block in colBlocks:
+                for eachCol in range(3):
+                    if eachCol == col:
+                        continue
 
-                for eachThree in range(len(theThree)):
+                    # count the solved locations on that column of the block that don't hold the value
                     counter = 0
-                    if theThree[eachThree]:  # because one index will be an empty list
-                        for threeIndex in theThree[eachThree]:
-                            # if solvedList[jj] is solved (has a 0)
-                            if not solvedList[threeIndex] and sudokuList[i][0] != sudokuList[threeIndex][0]:
-                                counter += 1
-                            # print(counter)
-                            # if the total count is 3, we can eliminate index i from last row of last colBlock
+                    for threeIndex in blockColCells[block][eachCol]:
+                        if not solvedList[threeIndex] and values[threeIndex] != value:
+                            counter += 1
+
+                    # if the total count is 3, we can eliminate the value from the last column of the last colBlock
                     if counter == 3:
-                        temp = colBlocks[:]  # NOTE: we need to put [:] or python will reference the same object
-                        temp.remove(block)
-                        lastBlock = temp.pop(0)
-                        temp = [0, 1, 2]
-                        temp.remove(col)
-                        temp.remove(threeIndex % 3)
-                        lastCol = temp.pop(0)
-                        startIndex = allBlocks[lastBlock][lastCol*3]  # we want to take 0, 1, or 2 and get index 0, 3, or 6, so multiply by 3
-                        for k in [0, 9, 18]:  # add 0, 9, and 18 to get column indices from the starting index
-                            #print('sudokuList[startIndex+k] is ' + str(sudokuList[startIndex+k]))
-                            try:
-                                sudokuList[startIndex+k][1].remove(sudokuList[i][0])
-                                #print('removed possibility of ' + str(sudokuList[i][0]) + ' from indices ' + str([startIndex, startIndex + 9, startIndex + 18]))
-                            except:
-                                #print('failed to remove possibility of ' + str(sudokuList[i][0]) + ' from indices ' + str([startIndex, startIndex + 9, startIndex + 18]))
-                                pass
-
-
-def guessValues(sudokuList2, solvedList2, guessList2, allBlocks, recursions = 0):
-
-    # enhance!
-    recursions += 1
-    print('recursion depth: ' + recursions * '*')
-
-    # base case - stops when all values are solved/guessed without conflicts
-    if 1 not in solvedList2:
-        return sudokuList2, solvedList2, guessList2
-
-    # create copies for recursion so we can undo changes if need be
-    sudokuListCopy = sudokuList2[:]
-    solvedListCopy = solvedList2[:]
-    guessListCopy = guessList2[:]
-
-    # sort the remaining items by their remaining possibilities
-    guessListCopy.sort(key=lambda x: len(x[1]))
-
-    # remove all values from guessList that have no guesses remaining (ie. they are solved)
-    while not guessListCopy[0][1]:
-        guessListCopy.pop(0)
-
-    # explore the next node
-    node = guessListCopy.pop(0)
-
-    # guess values
-    for i in range(len(node[1])):
-
-        # make the guess
-        sudokuListCopy[node[2]] = [node[1][i], [], node[2]]
-        solvedListCopy[node[2]] = 2
-
-        # test for conflicts
-        copiesAreOkay = testForDuplicates(sudokuListCopy)
-
-        # if no conflicts, continue with recursion to next guess
-        if copiesAreOkay:
-
-            # recursion
-            possibleSudoku, possibleSolved, possibleGuess = guessValues(sudokuListCopy, solvedListCopy, guessListCopy,
-                                                                        allBlocks, recursions)
-
-            # if solution is found, return solution
-            if 1 not in possibleSolved:
-                return possibleSudoku, possibleSolved, possibleGuess
-
-        # otherwise, if there was a conflict
-        else:
+                        lastBlock = colBlocks[0] if colBlocks[1] == block else colBlocks[1]
+                        lastCol = 3 - col - eachCol
+                        for k in blockColCells[lastBlock][lastCol]:
+                            if masks[k] & bit:
+                                removePossibility(sudokuList, k, bit)
 
-            # undo the change!
-            sudokuListCopy[node[2]] = node
-            solvedListCopy[node[2]] = 1
+    return True
 
-    # if all values had conflicts, return unchanged lists
-    return sudokuList2, solvedList2, guessList2
 
+def eliminate(sudokuList, i, bits, reason):
+    # take bits out of the location's possibilities for a strategy pass, saying why - False if none are left
+    if stepSink is not None:
+        stepSink(TraceEvent('eliminate', i, sudokuList.geometry.maskValues[bits], reason))
+    removePossibility(sudokuList, i, bits)
+    return sudokuList.masks[i] != 0
+
+
+def nakedSubsets(sudokuList, solvedList, largest=4):
+    # naked pairs, triples and quads: when k locations in a unit have only k possibilities between them,
+    # those values have to go there, so the rest of the unit can't have them
+    masks = sudokuList.masks
+    bitCount = sudokuList.geometry.bitCount
+    unitNames = sudokuList.geometry.unitNames
+
+    for u, unit in enumerate(sudokuList.geometry.allUnits):
+        openCells = [i for i in unit if masks[i]]
+        for size in range(2, min(largest, len(openCells) - 1) + 1):
+            for subset in combinations([i for i in openCells if bitCount[masks[i]] <= size], size):
+                union = 0
+                for i in subset:
+                    union |= masks[i]
+                if bitCount[union] != size:
+                    continue
+
+                for i in openCells:
+                    if masks[i] & union and i not in subset:
+                        if not eliminate(sudokuList, i, masks[i] & union, 'naked subset in the ' + unitNames[u]):
+                            return False
 
-def testForDuplicates(possibleSolution):
+    return True
 
-    for i in range(81):
 
-        # go through each index of current row
-        for r in range(9):
-            indexA = int(i / 9) * 9 + r
-            if possibleSolution[i][0] == possibleSolution[indexA][0]:
-                if possibleSolution[i][0] != 0:  # make sure it's not 0 == 0 for unknown cells
-                    if i != indexA:  # skip current index
-                        #print('found conflict at indices: ' + str(i) + ', ' + str(indexA))
-                        return False
+def hiddenSubsets(sudokuList, solvedList, largest=4):
+    # hidden pairs, triples and quads: when k values only fit in the same k locations of a unit,
+    # those locations can't hold anything else
+    masks = sudokuList.masks
+    unitMasks = sudokuList.unitMasks
+    geometry = sudokuList.geometry
+    bitCount = geometry.bitCount
+
+    for u, unit in enumerate(geometry.allUnits):
+        # value bit -> the positions in the unit it still fits, as a mask
+        spots = {}
+        for bit in geometry.digitBit[1:]:
+            if not unitMasks[u] & bit:
+                spots[bit] = 0
+                for k, i in enumerate(unit):
+                    if masks[i] & bit:
+                        spots[bit] |= 1 << k
+
+        for size in range(2, min(largest, len(spots) - 1) + 1):
+            for subset in combinations([bit for bit in spots if bitCount[spots[bit]] <= size], size):
+                where = 0
+                keep = 0
+                for bit in subset:
+                    where |= spots[bit]
+                    keep |= bit
+                if bitCount[where] != size:
+                    continue
+
+                for k, i in enumerate(unit):
+                    if where >> k & 1 and masks[i] & ~keep:
+                        if not eliminate(sudokuList, i, masks[i] & ~keep,
+                                         'hidden subset in the ' + geometry.unitNames[u]):
+                            return False
 
-        # go through each index of current column
-        for c in range(9):
-            indexB = (i % 9) + (9 * c)
-            if possibleSolution[i][0] == possibleSolution[indexB][0]:
-                if possibleSolution[i][0] != 0:  # make sure it's not 0 == 0 for unknown cells
-                    if i != indexB:  # skip current index
-                        #print('found conflict at indices: ' + str(i) + ', ' + str(indexB))
-                        return False
+    return True
+
+
+def pointingClaiming(sudokuList, solvedList):
+    # where a block crosses a row or column: a value that only fits the shared locations within the block
+    # can't go anywhere else on the line (pointing), and one that only fits them within the line
+    # can't go anywhere else in the block (claiming)
+    masks = sudokuList.masks
+    unitNames = sudokuList.geometry.unitNames
+
+    for line, block, shared, lineRest, blockRest in sudokuList.geometry.intersections:
+        here = 0
+        for i in shared:
+            here |= masks[i]
+        if not here:
+            continue
+        restOfLine = 0
+        for i in lineRest:
+            restOfLine |= masks[i]
+        restOfBlock = 0
+        for i in blockRest:
+            restOfBlock |= masks[i]
+
+        pointing = here & ~restOfBlock & restOfLine
+        for i in lineRest if pointing else ():
+            if masks[i] & pointing:
+                if not eliminate(sudokuList, i, masks[i] & pointing, 'pointing from the ' + unitNames[block]):
+                    return False
+
+        claiming = here & ~restOfLine & restOfBlock
+        for i in blockRest if claiming else ():
+            if masks[i] & claiming:
+                if not eliminate(sudokuList, i, masks[i] & claiming, 'claimed by the ' + unitNames[line]):
+                    return False
+
+    return True
+
+
+def fish(sudokuList, size, name):
+    # when a value's places in size rows all fall in the same size columns, those rows use up the value in
+    # each of the columns, so it can't go anywhere else in them - same again with rows and columns swapped
+    masks = sudokuList.masks
+    geometry = sudokuList.geometry
+    n = geometry.size
+    bitCount = geometry.bitCount
+    rows = geometry.allUnits[:n]
+    cols = geometry.allUnits[n:2 * n]
+
+    for bit in geometry.digitBit[1:]:
+        for base, cover in ((rows, cols), (cols, rows)):
+
+            # the lines with 2 to size places left for the value, and where those are
+            lines = []
+            for k, unit in enumerate(base):
+                spots = 0
+                for pos, i in enumerate(unit):
+                    if masks[i] & bit:
+                        spots |= 1 << pos
+                if 2 <= bitCount[spots] <= size:
+                    lines.append((k, spots))
+
+            for subset in combinations(lines, size):
+                where = 0
+                for k, spots in subset:
+                    where |= spots
+                if bitCount[where] != size:
+                    continue
+
+                chosen = [k for k, spots in subset]
+                for pos in range(n):
+                    if where >> pos & 1:
+                        for k, i in enumerate(cover[pos]):
+                            if masks[i] & bit and k not in chosen:
+                                if not eliminate(sudokuList, i, bit, name):
+                                    return False
+
+    return True
+
+
+def xWing(sudokuList, solvedList):
+    return fish(sudokuList, 2, 'X-Wing')
 
-        # go through each index of current 3x3 block
-        for u in range(3):
-            for v in range(3):
-                indexC = ((int(i / 3) * 3 + u) % 9) + (9 * v) + (int(i / 27) * 27)
-                if possibleSolution[i][0] == possibleSolution[indexC][0]:
-                    if possibleSolution[i][0] != 0:  # make sure it's not 0 == 0 for unknown cells
-                        if i != indexC:  # skip current index
-                            #print('found conflict at indices: ' + str(i) + ', ' + str(indexC))
-                            return False
 
-    # otherwise no collisions so return True
+def swordfish(sudokuList, solvedList):
+    return fish(sudokuList, 3, 'Swordfish')
+
+
+def xyWing(sudokuList, solvedList):
+    # a pivot with possibilities xy that sees pincers with xz and yz: whichever value the pivot takes,
+    # one of the pincers ends up z, so anything that sees both pincers can't be z
+    masks = sudokuList.masks
+    geometry = sudokuList.geometry
+    bitCount = geometry.bitCount
+    peerSets = geometry.peerSets
+
+    for pivot in range(geometry.cells):
+        pivotMask = masks[pivot]
+        if bitCount[pivotMask] != 2:
+            continue
+
+        wings = [i for i in geometry.peerList[pivot] if bitCount[masks[i]] == 2 and bitCount[masks[i] & pivotMask] == 1]
+        for a, b in combinations(wings, 2):
+            z = masks[a] & masks[b]
+            if bitCount[z] != 1 or z & pivotMask or masks[a] & pivotMask == masks[b] & pivotMask:
+                continue
+
+            for i in peerSets[a] & peerSets[b]:
+                if masks[i] & z:
+                    if not eliminate(sudokuList, i, z, 'XY-Wing'):
+                        return False
+
     return True
 
 
+# every pass deduce() can run, by name - each takes (sudokuList, solvedList), only places values or takes away
+# possibilities, and returns False if it finds the board broken (stats count each one under its name)
+strategyPasses = OrderedDict((strategy.__name__, strategy) for strategy in (
+    removePossibilities2, removePossibilities3, nakedSubsets, hiddenSubsets, pointingClaiming, xWing, swordfish,
+    xyWing))
+
+# which of them run, in order: deductionPasses before guessing, and searchPasses after every guess as well,
+# where each one makes the guesses dearer but can save a lot of them
+# until setPasses() picks some, deductionPasses is None and boards get defaultPasses[is it 9x9] - the
+# removePossibilities2/3 block patterns only exist on 9x9 boards, and pointingClaiming makes the same
+# eliminations on every other size
+defaultPasses = {True: ('removePossibilities2', 'removePossibilities3'), False: ('pointingClaiming',)}
+deductionPasses = None
+searchPasses = ()
+
+
+def setPasses(passes=None, duringSearch=None):
+    # pick the strategy passes by name - None leaves that list as it is
+    global deductionPasses, searchPasses
+    for name in tuple(passes or ()) + tuple(duringSearch or ()):
+        if name not in strategyPasses:
+            raise ValueError('unknown strategy pass: ' + str(name))
+    if passes is not None:
+        deductionPasses = tuple(passes)
+    if duringSearch is not None:
+        searchPasses = tuple(duringSearch)
+
+
+def workerSettings():
+    # what setPasses() and setTrace() picked, for initWorker() to copy into pool workers - ones that are spawned
+    # rather than forked start from a fresh import, with the default passes and tracing off
+    # (a sink other than logEvent has to be picklable, e.g. a module level function, to get there)
+    return deductionPasses, searchPasses, summarySink, stepSink
+
+
+def initWorker(settings):
+    # pool initializer taking workerSettings() - tracing to the log also needs the log set up again
+    global deductionPasses, searchPasses, summarySink, stepSink
+    deductionPasses, searchPasses, summarySink, stepSink = settings
+    if logEvent in (summarySink, stepSink):
+        import logging
+        logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+
+def guessValues(sudokuList, solvedList, maxNodes=None, maxTime=None, maxDepth=None, limit=1, table=None):
+    # depth-first search with an explicit stack, so deep boards can't hit the recursion limit
+    # maxNodes caps the guesses made, maxTime the seconds spent and maxDepth the guesses stacked up at once
+    # the search stops at the limit'th solution and leaves it on the board - with a limit above 1 it counts its way
+    # past the earlier ones, and if there turn out to be fewer the board is put back and solutions says how many
+    # with a TranspositionTable, guesses leading to subtrees it has counted before are skipped (as long as that
+    # doesn't skip the limit'th solution), and every subtree explored to the end is counted into it
+    if maxTime is not None:
+        deadline = time.perf_counter() + maxTime
+
+    # explore the unsolved location with the fewest possibilities
+    node = pickLocation(sudokuList)
+
+    # stops straight away when all values are already solved
+    if node is None:
+        return SearchResult(SOLVED, 0, 0, 0, 1)
+
+    # each level remembers its location, where the trail was before guessing it, and the values left to try -
+    # plus, for the table, the hash of its board, the key it's stored under (the hash of the board before the
+    # guess leading to it was propagated), and the solutions and cut offs there were before it was entered
+    maskValues = sudokuList.geometry.maskValues
+    passes = searchPasses
+    trail = sudokuList.trail
+    boardKey = key = None
+    if table is not None:
+        zobrist = zobristKeys(sudokuList.geometry)
+        boardKey = boardHash(sudokuList)
+    stack = [(node, len(trail), iter(maskValues[sudokuList.masks[node]]), boardKey, None, 0, 0)]
+    sink = stepSink
+    nodes = 0
+    deepest = 1
+    backtracks = 0
+    solutions = 0
+    cutOffs = 0
+
+    while stack:
+        node, mark, guesses, boardKey = stack[-1][:4]
+
+        for value in guesses:
+
+            # a subtree counted before only needs its count
+            if table is not None:
+                key = boardKey ^ zobrist[node][value]
+                known = table.lookup(key)
+                if known is not None and solutions + known < limit:
+                    solutions += known
+                    continue
+
+            # enhance!
+            nodes += 1
+            if sink is not None:
+                sink(TraceEvent('guess', node, value, len(stack)))
+
+            # out of budget - put the board back to how we found it
+            if (maxNodes is not None and nodes > maxNodes) or (maxTime is not None and time.perf_counter() > deadline):
+                undoChanges(sudokuList, solvedList, stack[0][1])
+                return SearchResult(BUDGET_EXCEEDED, nodes - 1, deepest, backtracks, solutions)
+
+            # make the guess - placeValue only checks the guessed location's units for conflicts,
+            # and propagate() catches anything the guess breaks further out
+            if placeValue(sudokuList, solvedList, node, value, 2) and \
+                    (deduce(sudokuList, solvedList, passes) if passes else propagate(sudokuList, solvedList)):
+                nextNode = pickLocation(sudokuList)
+
+                # if solution is found, leave it on the board - unless we're still counting
+                if nextNode is None:
+                    solutions += 1
+                    if table is not None:
+                        table.add(key, 1)
+                    if solutions == limit:
+                        return SearchResult(SOLVED, nodes, deepest, backtracks, solutions)
+
+                # go one level deeper, unless that's past the allowed depth
+                elif maxDepth is None or len(stack) < maxDepth:
+                    # the new board's hash adds in everything placed since the guess
+                    nextKey = None
+                    if table is not None:
+                        nextKey = boardKey
+                        for i, mask, placed in islice(trail, mark, None):
+                            if placed:
+                                nextKey ^= zobrist[i][sudokuList.values[i]]
+                    stack.append((nextNode, len(trail), iter(maskValues[sudokuList.masks[nextNode]]), nextKey,
+                                  key, solutions, cutOffs))
+                    deepest = max(deepest, len(stack))
+                    break
+
+                else:
+                    cutOffs += 1
+
+            elif table is not None:
+                table.add(key, 0)
+
+            # undo the change!
+            undoChanges(sudokuList, solvedList, mark)
+            backtracks += 1
+
+        else:
+            # every value here had conflicts - back up and undo the guess one level up
+            level = stack.pop()
+            if table is not None and stack and cutOffs == level[6]:
+                table.add(level[4], solutions - level[5])
+            if stack:
+                undoChanges(sudokuList, solvedList, stack[-1][1])
+                backtracks += 1
+
+    # the board is back to how we found it - if the depth limit skipped anything we can't rule out (more) solutions
+    if cutOffs:
+        return SearchResult(BUDGET_EXCEEDED, nodes, deepest, backtracks, solutions)
+    return SearchResult(SOLVED if solutions else UNSOLVABLE, nodes, deepest, backtracks, solutions)
+
+
+def pickLocation(sudokuList):
+    # find the unsolved location with the fewest possibilities, or None if everything is solved
+    masks = sudokuList.masks
+    bitCount = sudokuList.geometry.bitCount
+    best = None
+    bestCount = sudokuList.geometry.size + 1
+    for i in range(sudokuList.geometry.cells):
+        if masks[i] and bitCount[masks[i]] < bestCount:
+            best = i
+            bestCount = bitCount[masks[i]]
+
+            # nothing unsolved has fewer than 2 possibilities after propagating
+            if bestCount == 2:
+                break
+
+    return best
+
+
+##################################################
+# DANCING LINKS
+##################################################
+# exact cover backend: 324 constraints (each location filled, and each value once per row, column and block)
+# against 729 candidate rows (one value in one location), kept as flat link arrays like Knuth's Algorithm X
+linkTemplate = None
+
+
+def buildLinks():
+    # node 0 is the root, nodes 1-324 are the constraint headers, then 4 nodes for each candidate row
+    headers = 324
+    left = [headers] + list(range(headers))
+    right = list(range(1, headers + 1)) + [0]
+    up = list(range(headers + 1))
+    down = list(range(headers + 1))
+    column = list(range(headers + 1))
+    candidate = [-1] * (headers + 1)
+    size = [0] * (headers + 1)
+
+    for i in range(81):
+        for n in range(9):
+            first = len(left)
+            constraints = (1 + i, 82 + rowOf[i] * 9 + n, 163 + colOf[i] * 9 + n, 244 + blockOf[i] * 9 + n)
+            for k in range(4):
+                node = first + k
+                c = constraints[k]
+                left.append(first + (k + 3) % 4)
+                right.append(first + (k + 1) % 4)
+
+                # hang the node off the bottom of its constraint's column
+                up.append(up[c])
+                down.append(c)
+                down[up[c]] = node
+                up[c] = node
+
+                column.append(c)
+                candidate.append(i * 9 + n)
+                size[c] += 1
+
+    return left, right, up, down, column, candidate, size
+
+
+def dancingLinks(valueList, solvedList, maxNodes=None, maxTime=None, maxDepth=None):
+    # solve the puzzle as an exact cover problem, returning a SearchResult and the 81 values found
+    # (just the known values if there's no solution or the budget runs out)
+    global linkTemplate
+    if linkTemplate is None:
+        linkTemplate = buildLinks()
+    left, right, up, down, column, candidate, size = [links[:] for links in linkTemplate]
+
+    if maxTime is not None:
+        deadline = time.perf_counter() + maxTime
+
+    def cover(c):
+        # unlink the constraint, and every candidate row that would also satisfy it
+        right[left[c]] = right[c]
+        left[right[c]] = left[c]
+        i = down[c]
+        while i != c:
+            j = right[i]
+            while j != i:
+                up[down[j]] = up[j]
+                down[up[j]] = down[j]
+                size[column[j]] -= 1
+                j = right[j]
+            i = down[i]
+
+    def uncover(c):
+        # exactly reverse cover()
+        i = up[c]
+        while i != c:
+            j = left[i]
+            while j != i:
+                size[column[j]] += 1
+                up[down[j]] = j
+                down[up[j]] = j
+                j = left[j]
+            i = up[i]
+        right[left[c]] = c
+        left[right[c]] = c
+
+    def select(row):
+        # cover the rest of the constraints the candidate row satisfies
+        j = right[row]
+        while j != row:
+            cover(column[j])
+            j = right[j]
+
+    def unselect(row):
+        j = left[row]
+        while j != row:
+            uncover(column[j])
+            j = left[j]
+
+    # the known values are chosen up front - if one of their constraints is already gone, two of them clash
+    values = [0] * 81
+    for i in range(81):
+        if not solvedList[i]:
+            values[i] = valueList[i]
+
+    for i in range(81):
+        if values[i]:
+            row = 325 + (i * 9 + values[i] - 1) * 4
+            for k in range(4):
+                c = column[row + k]
+                if right[left[c]] != c:
+                    return SearchResult(UNSOLVABLE, 0, 0, 0, 0), values
+            cover(column[row])
+            select(row)
+
+    # each level holds the constraint being satisfied and the candidate row currently chosen for it
+    stack = []
+    nodes = 0
+    deepest = 0
+    backtracks = 0
+    cutOff = False
+    backtrack = False
+
+    while True:
+        if not backtrack:
+            # every constraint is satisfied
+            if right[0] == 0:
+                for c, row in stack:
+                    values[candidate[row] // 9] = candidate[row] % 9 + 1
+                return SearchResult(SOLVED, nodes, deepest, backtracks, 1), values
+
+            # satisfy the constraint with the fewest candidate rows left
+            c = right[0]
+            best = c
+            while c:
+                if size[c] < size[best]:
+                    best = c
+                    if size[c] < 2:
+                        break
+                c = right[c]
+
+            if size[best] and (maxDepth is None or len(stack) < maxDepth):
+                nodes += 1
+                if (maxNodes is not None and nodes > maxNodes) or (maxTime is not None and time.perf_counter() > deadline):
+                    return SearchResult(BUDGET_EXCEEDED, nodes - 1, deepest, backtracks, 0), values
+                cover(best)
+                stack.append([best, down[best]])
+                deepest = max(deepest, len(stack))
+                select(down[best])
+                continue
+
+            cutOff = cutOff or bool(size[best])
+            backtrack = True
+
+        # undo the last choice and try the next candidate row for that constraint
+        if not stack:
+            return SearchResult(BUDGET_EXCEEDED if cutOff else UNSOLVABLE, nodes, deepest, backtracks, 0), values
+        level = stack[-1]
+        unselect(level[1])
+        backtracks += 1
+        level[1] = down[level[1]]
+        if level[1] == level[0]:
+            uncover(level[0])
+            stack.pop()
+            continue
+
+        nodes += 1
+        if (maxNodes is not None and nodes > maxNodes) or (maxTime is not None and time.perf_counter() > deadline):
+            return SearchResult(BUDGET_EXCEEDED, nodes - 1, deepest, backtracks, 0), values
+        select(level[1])
+        backtrack = False
+
+
+##################################################
+# SOLUTION CHECKING
+##################################################
 def checkPuzzle(puzzle1, puzzle2):
 
     counter = 0
@@ -660,28 +1762,1315 @@ def checkPuzzle(puzzle1, puzzle2):
     return counter
 
 
-def main():
+# checkSolution keeps all of a board's unit masks side by side in one int - unit u's values at bits u * size
+# up to u * size + size - 1 - and builds it in a single pass by adding up what each location sets in its units.
+# Adding up k single bits only ends up with k bits set if none of them landed on the same bit, so the board
+# is complete and has no repeats exactly when every bit of the total is set.
+checkTables = {}
+
+# puzzle byte -> 0xFF for a given and 0 for a blank, and -> itself for a given and 0 for a blank
+givenMask = bytes(0 if c in b'0.' else 255 for c in range(256))
+givenValue = bytes(0 if c in b'0.' else c for c in range(256))
+
+
+def buildCheckTables(geometry):
+    # location -> {character -> the bits it sets in the location's units, none for a blank},
+    # and the total a correct board adds up to
+    tables = checkTables.get(geometry.cells)
+    if tables is None:
+        size = geometry.size
+        cellBits = []
+        for ids in geometry.unitIdsOf:
+            bits = {'0': 0, '.': 0}
+            for v in range(1, size + 1):
+                symbol = geometry.symbols[v]
+                bits[symbol] = bits[symbol.lower()] = sum(1 << (u * size + v - 1) for u in ids)
+            cellBits.append(bits)
+        tables = checkTables[geometry.cells] = (cellBits, (1 << (size * len(geometry.allUnits))) - 1)
+
+    return tables
+
+
+def checkSolution(puzzle, solution):
+    # why solution doesn't solve puzzle, or None if it does - it has to be complete, have each value once in
+    # every row, column and block, and keep every given (puzzle can be None to only check the board itself)
+    if puzzle is not None and len(puzzle) != len(solution):
+        return 'wrong length'
+    try:
+        geometry = geometryFor(len(solution))
+    except ValueError:
+        return 'wrong length'
+
+    cellBits, correct = buildCheckTables(geometry)
+    try:
+        total = sum(map(getitem, cellBits, solution))
+    except KeyError:
+        return 'unexpected characters'
+    if total != correct:
+        return 'not filled in' if '0' in solution or '.' in solution else 'repeats a value'
+
+    # the solution's characters, kept only where the puzzle has a given, have to be the givens
+    if puzzle is not None:
+        if geometry.size > 9:
+            puzzle, solution = puzzle.upper(), solution.upper()
+        given = puzzle.encode('ascii', 'replace')
+        kept = int.from_bytes(solution.encode('ascii'), 'big') & int.from_bytes(given.translate(givenMask), 'big')
+        if kept != int.from_bytes(given.translate(givenValue), 'big'):
+            return 'changes a given'
+
+    return None
+
+
+def validatePuzzle(puzzle, thorough=False):
+    # why puzzle gets turned away, or None if it's worth solving - it has to be a board's worth of values and
+    # blanks ('0' or '.') without a value given twice in a row, column or block. thorough places the givens and
+    # propagates them too, catching the puzzles that contradict themselves further out (see boardProblem)
+    try:
+        geometry = geometryFor(len(puzzle)) if puzzle else None
+    except ValueError:
+        geometry = None
+    if geometry is None:
+        return WRONG_LENGTH
+
+    # the same sum checkSolution makes - each given sets 3 bits, and without repeats none of them carry
+    cellBits, correct = buildCheckTables(geometry)
+    try:
+        total = sum(map(getitem, cellBits, puzzle))
+    except KeyError:
+        return BAD_CHARACTERS
+    if bin(total).count('1') != 3 * (len(puzzle) - puzzle.count('0') - puzzle.count('.')):
+        return REPEATED_GIVEN
+
+    if thorough:
+        sudokuList, solvedList = newBoard(puzzle)
+        if sudokuList is None:
+            return REPEATED_GIVEN
+        if not deduce(sudokuList, solvedList):
+            return boardProblem(sudokuList)
+
+    return None
+
+
+def checkMany(pairs, batchSize=65536):
+    # checkSolution over an iterable of (puzzle, solution) pairs, yielding (index, reason) for each one that fails
+    # with numpy, 9x9 boards are checked batchSize at a time the same way checkSolution does it, adding up each
+    # unit's bits with one matrix product for the whole batch, and only the ones that fail that go through
+    # checkSolution to find out why
+    try:
+        importNumpy()
+    except RuntimeError:
+        for index, (puzzle, solution) in enumerate(pairs):
+            reason = 'no solution' if solution is None else checkSolution(puzzle, solution)
+            if reason is not None:
+                yield index, reason
+        return
+
+    # location, unit -> 1 if the location is in the unit
+    membership = numpy.zeros((81, len(allUnits)), dtype=numpy.float32)
+    for u, unit in enumerate(allUnits):
+        membership[unit, u] = 1
+
+    pairs = iter(pairs)
+    first = 0
+    while True:
+        batch = list(islice(pairs, batchSize))
+        if not batch:
+            break
+
+        # usually every pair in the batch is a 9x9 puzzle and solution, otherwise only those ones are checked here
+        puzzles = [puzzle for puzzle, solution in batch]
+        solutions = [solution for puzzle, solution in batch]
+        failed = set()
+        if None in solutions or set(map(len, puzzles)) != {81} or set(map(len, solutions)) != {81}:
+            checked = [k for k, (puzzle, solution) in enumerate(batch)
+                       if solution is not None and len(puzzle) == 81 and len(solution) == 81]
+            puzzles = [puzzles[k] for k in checked]
+            solutions = [solutions[k] for k in checked]
+            failed.update(set(range(len(batch))).difference(checked))
+        else:
+            checked = range(len(batch))
+
+        # '1' to '9' are 0x31 to 0x39, so once every character is known to be one of them, (1 << the low 4 bits)
+        # is the value's bit shifted up one, and a unit is complete with no repeats when those add up to
+        # allDigits << 1 (float32 adds these small ints up exactly, and lets the product go through BLAS)
+        given = numpy.frombuffer(''.join(puzzles).encode('ascii', 'replace'), dtype=numpy.uint8).reshape(-1, 81)
+        filled = numpy.frombuffer(''.join(solutions).encode('ascii', 'replace'), dtype=numpy.uint8).reshape(-1, 81)
+        correct = ((filled - ord('1')) < 9).all(axis=1)
+        bits = (numpy.uint16(1) << (filled & 15)).astype(numpy.float32)
+        correct &= ((bits @ membership) == allDigits << 1).all(axis=1)
+        correct &= ((given == filled) | (given == ord('0')) | (given == ord('.'))).all(axis=1)
+
+        failed.update(checked[k] for k in numpy.flatnonzero(~correct).tolist())
+        for k in sorted(failed):
+            puzzle, solution = batch[k]
+            reason = 'no solution' if solution is None else checkSolution(puzzle, solution)
+            if reason is not None:
+                yield first + k, reason
+        first += len(batch)
+
+
+##################################################
+# PACKED FILES
+##################################################
+# a binary corpus format: a 16 byte header (packedHeader - magic, version, box size, kind, whether solutions
+# follow, record size) and then one fixed-size record per board, so the k'th one is found without reading
+# the ones before it. Records are either
+#   PACKED_VALUES - every location's value (0 for blank), 4 bits each with the first location in the high half
+#                   of the byte for boards up to 9x9 (41 bytes), a byte each past that - then the solution the
+#                   same way if the file has them
+#   PACKED_MASKS - every location's little-endian possibility mask, with a placed value stored as its bit
+#                  (2 bytes each, 4 past 16x16), for half-solved boards
+packedMagic = b'SDKP'
+packedHeader = struct.Struct('<4sBBBBI4x')
+PACKED_VALUES = 0
+PACKED_MASKS = 1
+
+
+def packedWidth(geometry, kind):
+    # bytes taken by one board in a record
+    if kind == PACKED_MASKS:
+        return geometry.cells * (2 if geometry.maskType == 'H' else 4)
+    return (geometry.cells + 1) // 2 if geometry.size <= 15 else geometry.cells
+
+
+def packValues(values, geometry):
+    # a board's values (ints) as record bytes
+    values = bytes(values)
+    if geometry.size > 15:
+        return values
+    if len(values) % 2:
+        values += b'\0'
+    return bytes([high << 4 | low for high, low in zip(values[0::2], values[1::2])])
+
+
+def writePacked(puzzles, target, kind=PACKED_VALUES):
+    # write a packed file from text (puzzle, solution) pairs (solution may be None) - or from SudokuBoards
+    # for PACKED_MASKS - and return how many boards went in. The first one sets the board size, and
+    # whether there are solutions in a values file.
+    puzzles = iter(puzzles)
+    first = next(puzzles, None)
+    if first is None:
+        return 0
+    if kind == PACKED_MASKS:
+        geometry = first.geometry
+        withSolutions = False
+    else:
+        geometry = geometryFor(len(first[0]))
+        withSolutions = first[1] is not None
+    width = packedWidth(geometry, kind)
+    blank = bytes(width)
+
+    stream = sys.stdout.buffer if target == '-' else open(target, 'wb')
+    count = 0
+    try:
+        stream.write(packedHeader.pack(packedMagic, 1, geometry.boxSize, kind, withSolutions,
+                                       width * (2 if withSolutions else 1)))
+        for item in chain([first], puzzles):
+            if kind == PACKED_MASKS:
+                masks = array(geometry.maskType, [mask or geometry.digitBit[value]
+                                                  for mask, value in zip(item.masks, item.values)])
+                if sys.byteorder != 'little':
+                    masks.byteswap()
+                stream.write(masks.tobytes())
+            else:
+                puzzle, solution = item
+                if len(puzzle) != geometry.cells:
+                    raise ValueError('every puzzle in a packed file has to be the same size')
+                stream.write(packValues(geometry.valuesOf(puzzle), geometry))
+                if withSolutions:
+                    stream.write(packValues(geometry.valuesOf(solution), geometry) if solution else blank)
+            count += 1
+    finally:
+        if stream is not sys.stdout.buffer:
+            stream.close()
+        else:
+            stream.flush()
+
+    return count
+
+
+class PackedPuzzles(object):
+    """A packed file opened for reading. It's memory-mapped, and record() and masks() hand out memoryviews
+    straight into the mapping, so nothing is copied until something is decoded - they're only good until
+    close(). values() decodes a board to a bytes of ints that solvePuzzle takes as it is, puzzle() and
+    solution() decode to text, and iterating gives (puzzle, solution) pairs like readPuzzles does."""
+
+    def __init__(self, path):
+        self.handle = open(path, 'rb')
+        try:
+            self.data = mmap.mmap(self.handle.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.handle.close()
+            raise ValueError(path + ' is empty')
+        if len(self.data) < packedHeader.size:
+            self.close()
+            raise ValueError(path + ' is too short to be a packed file')
+        magic, version, boxSize, kind, withSolutions, stride = packedHeader.unpack_from(self.data)
+        if magic != packedMagic or version != 1 or kind not in (PACKED_VALUES, PACKED_MASKS) or not 2 <= boxSize <= 5:
+            self.close()
+            raise ValueError(path + ' isn\'t a packed file this version can read')
+
+        self.geometry = geometryFor(boxSize ** 4)
+        self.kind = kind
+        self.withSolutions = bool(withSolutions)
+        self.width = packedWidth(self.geometry, kind)
+        # a record is a puzzle, followed by its solution if the file has them - any other stride would
+        # decode garbage, or divide by zero when it's 0
+        expected = self.width * (2 if self.withSolutions else 1)
+        if stride != expected:
+            self.close()
+            raise ValueError(path + ' has records of ' + str(stride) + ' bytes, not ' + str(expected))
+        self.stride = stride
+        self.view = memoryview(self.data)[packedHeader.size:]
+        self.count = len(self.view) // stride
+
+        # translate() tables: record byte -> the value of its high or low location, and value -> its character
+        self.highValues = bytes(byte >> 4 for byte in range(256))
+        self.lowValues = bytes(byte & 15 for byte in range(256))
+        symbols = self.geometry.symbols
+        self.byteText = bytes(ord(symbols[value]) if value < len(symbols) else ord('?') for value in range(256))
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for k in range(self.count):
+            yield self.puzzle(k), self.solution(k) if self.withSolutions else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def record(self, k):
+        if not 0 <= k < self.count:
+            raise IndexError('board ' + str(k) + ' is out of range')
+        return self.view[k * self.stride:(k + 1) * self.stride]
+
+    def values(self, k, solution=False):
+        # the board's (or its solution's) values as a bytes of ints, 0 for blank
+        if self.kind == PACKED_MASKS:
+            bitValue = self.geometry.bitValue
+            return bytes(bitValue.get(mask, 0) for mask in self.masks(k))
+        part = bytes(self.record(k)[self.width:] if solution else self.record(k)[:self.width])
+        if self.geometry.size > 15:
+            return part
+        values = bytearray(2 * len(part))
+        values[0::2] = part.translate(self.highValues)
+        values[1::2] = part.translate(self.lowValues)
+        return bytes(values[:self.geometry.cells])
+
+    def masks(self, k):
+        # a masks file's possibility masks for the board, without copying on little-endian machines
+        if self.kind != PACKED_MASKS:
+            raise ValueError('only masks files hold possibility masks')
+        if sys.byteorder == 'little':
+            return self.record(k).cast(self.geometry.maskType)
+        masks = array(self.geometry.maskType, self.record(k))
+        masks.byteswap()
+        return masks
+
+    def puzzle(self, k):
+        return self.values(k).translate(self.byteText).decode('ascii')
+
+    def solution(self, k):
+        return self.values(k, True).translate(self.byteText).decode('ascii') if self.withSolutions else None
+
+    def asArray(self):
+        # every record as one (boards, record size) numpy uint8 array over the mapping itself - needs numpy
+        importNumpy('asArray')
+        return numpy.frombuffer(self.data, dtype=numpy.uint8, count=self.count * self.stride,
+                                offset=packedHeader.size).reshape(self.count, self.stride)
+
+    def close(self):
+        # views still held elsewhere keep the mapping alive until they're gone
+        if getattr(self, 'view', None) is not None:
+            self.view.release()
+            self.view = None
+        if getattr(self, 'data', None) is not None:
+            try:
+                self.data.close()
+            except BufferError:
+                pass
+            self.data = None
+        self.handle.close()
+
+
+##################################################
+# SOLUTION CACHE
+##################################################
+# a puzzle stays the same puzzle under digit relabelling, row swaps within a band, band swaps, column swaps
+# within a stack, stack swaps and transposing - canonicalForm() picks one representative of all of those so
+# transformed copies of a puzzle share a cache entry
+transposeCells = [(k % 9) * 9 + k // 9 for k in range(81)]
+
+
+def tiedOrders(items, signatures):
+    # every ordering of items sorted by signature, trying each arrangement of the items whose signatures tie
+    groups = []
+    for item in sorted(items, key=lambda x: signatures[x]):
+        if groups and signatures[groups[-1][0]] == signatures[item]:
+            groups[-1].append(item)
+        else:
+            groups.append([item])
+
+    orders = [[]]
+    for group in groups:
+        orders = [order + list(arrangement) for order in orders for arrangement in permutations(group)]
+    return orders
+
+
+def canonicalForm(puzzle, maxOrderings=64):
+    # returns (key, cells, labels): the canonical puzzle string, where cell k of it came from, and how its digits
+    # were renamed, so key[k] == labels[puzzle[cells[k]]]
+    # rows, bands, columns and stacks are sorted by how many clues they hold, which doesn't change under any of
+    # the symmetries - only ties are tried both ways, at most maxOrderings times per orientation, and the
+    # smallest relabelled string wins. Capping can miss some matches, but every key still maps back exactly.
+    grid = puzzle.replace('.', '0')
+    best = None
+
+    for base in (range(81), transposeCells):
+        filled = [grid[base[k]] != '0' for k in range(81)]
+
+        # a row's signature is its clue count per block, sorted so swapping stacks or columns can't change it
+        rowSigs = []
+        colSigs = []
+        for n in range(9):
+            rowSegs = [filled[n * 9 + s * 3] + filled[n * 9 + s * 3 + 1] + filled[n * 9 + s * 3 + 2] for s in range(3)]
+            colSegs = [filled[s * 27 + n] + filled[s * 27 + 9 + n] + filled[s * 27 + 18 + n] for s in range(3)]
+            rowSigs.append((sum(rowSegs), sorted(rowSegs)))
+            colSigs.append((sum(colSegs), sorted(colSegs)))
+        bandSigs = [sorted(rowSigs[b * 3:b * 3 + 3]) for b in range(3)]
+        stackSigs = [sorted(colSigs[b * 3:b * 3 + 3]) for b in range(3)]
+
+        choices = [tiedOrders(range(3), bandSigs), tiedOrders(range(3), stackSigs)]
+        choices += [tiedOrders(range(b * 3, b * 3 + 3), rowSigs) for b in range(3)]
+        choices += [tiedOrders(range(b * 3, b * 3 + 3), colSigs) for b in range(3)]
+
+        for bands, stacks, r0, r1, r2, c0, c1, c2 in islice(product(*choices), maxOrderings):
+            rowGroups = (r0, r1, r2)
+            colGroups = (c0, c1, c2)
+            rows = [r for b in bands for r in rowGroups[b]]
+            cols = [c for s in stacks for c in colGroups[s]]
+            cells = [base[r * 9 + c] for r in rows for c in cols]
+
+            # rename the digits in the order they first show up
+            labels = {'0': '0'}
+            key = ''
+            for c in cells:
+                char = grid[c]
+                if char not in labels:
+                    labels[char] = str(len(labels))
+                key += labels[char]
+
+            if best is None or key < best[0]:
+                best = (key, cells, labels)
+
+    # digits missing from the clues still need a name so solutions can be mapped back
+    key, cells, labels = best
+    for char in '123456789':
+        if char not in labels:
+            labels[char] = str(len(labels))
+
+    return best
+
+
+class SolutionCache(object):
+    """LRU cache of solutions in front of solvePuzzle. Puzzles that are transformed copies of each other
+    (see canonicalForm) share an entry: the solution is stored in canonical form and mapped back through the
+    inverse transform on a hit. Every entry maps a puzzle string to the solution of that exact string, so the
+    puzzles themselves are stored too and exact repeats skip canonicalising.
+
+    maxSize bounds the in-memory entries; path adds a persistent shelve tier for the canonical entries that
+    survives restarts. Only complete solutions are stored."""
+
+    def __init__(self, maxSize=100000, path=None, maxOrderings=64):
+        self.maxSize = maxSize
+        self.maxOrderings = maxOrderings
+        self.entries = OrderedDict()
+        self.pending = {}
+        self.hits = 0
+        self.misses = 0
+        self.store = None
+        if path is not None:
+            import shelve
+            self.store = shelve.open(path)
+
+    def lookup(self, puzzle):
+        # the puzzle's solution if it, or a transformed copy of it, was solved before - otherwise None
+        solution = self.entries.get(puzzle.replace('.', '0'))
+        if solution is not None:
+            self.entries.move_to_end(puzzle.replace('.', '0'))
+            self.hits += 1
+            return solution
+
+        # canonical forms are only worked out for 9x9 boards - bigger ones have to match exactly
+        if len(puzzle) != 81:
+            self.misses += 1
+            return None
+
+        key, cells, labels = transform = canonicalForm(puzzle, self.maxOrderings)
+        canonical = self.entries.get(key)
+        if canonical is not None:
+            self.entries.move_to_end(key)
+        elif self.store is not None and key in self.store:
+            canonical = self.store[key]
+            self.remember(key, canonical)
+
+        if canonical is None:
+            self.misses += 1
+            self.pending[puzzle] = transform
+            return None
+
+        self.hits += 1
+        names = {label: char for char, label in labels.items()}
+        solution = [''] * 81
+        for k in range(81):
+            solution[cells[k]] = names[canonical[k]]
+        solution = ''.join(solution)
+        self.remember(puzzle.replace('.', '0'), solution)
+        return solution
+
+    def add(self, puzzle, solution):
+        # store a solution - puzzles that weren't just looked up get canonicalised again
+        transform = self.pending.pop(puzzle, None)
+        if '0' in solution or len(solution) != len(puzzle):
+            return
+        if len(puzzle) != 81:
+            self.remember(puzzle.replace('.', '0'), solution)
+            return
+        key, cells, labels = transform or canonicalForm(puzzle, self.maxOrderings)
+        canonical = ''.join(labels[solution[c]] for c in cells)
+        self.remember(key, canonical)
+        self.remember(puzzle.replace('.', '0'), solution)
+        if self.store is not None:
+            self.store[key] = canonical
+
+    def remember(self, key, canonical):
+        self.entries[key] = canonical
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxSize:
+            self.entries.popitem(last=False)
+
+    def solve(self, puzzle, **options):
+        # solve an 81 character puzzle, skipping the solver entirely on a hit
+        # options go through to solvePuzzle (maxNodes, maxTime, maxDepth, backend, stats)
+        solution = self.lookup(puzzle)
+        if solution is None:
+            valueList, solvedList = splitPuzzle(puzzle)
+            solution = solvePuzzle(valueList, solvedList, **options)
+            self.add(puzzle, solution)
+        return solution
+
+    def close(self):
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+
+
+##################################################
+# TRANSPOSITION TABLE
+##################################################
+# a board's possibilities all follow from the values placed on it, so the values alone decide how many ways it
+# can be finished - a board is keyed by XORing together one random 64 bit number per (location, value) placed,
+# which guessValues keeps up to date as it places and undoes values instead of hashing every board from scratch
+zobristTables = {}
+
+
+def zobristKeys(geometry):
+    # zobristKeys(geometry)[i][value] for every location and value - the same numbers every run
+    keys = zobristTables.get(geometry.cells)
+    if keys is None:
+        rng = random.Random(geometry.cells)
+        keys = zobristTables[geometry.cells] = [[rng.getrandbits(64) for value in range(geometry.size + 1)]
+                                                for i in range(geometry.cells)]
+    return keys
+
+
+def boardHash(sudokuList):
+    # the key of a board, from scratch
+    keys = zobristKeys(sudokuList.geometry)
+    key = 0
+    for i, value in enumerate(sudokuList.values):
+        if value:
+            key ^= keys[i][value]
+    return key
+
+
+class TranspositionTable(object):
+    """LRU table of how many solutions boards met during guessValues have, keyed by boardHash - 0 marks a dead end.
+    Only counts of subtrees that were searched to the end go in, so every entry is exact and holds for any puzzle
+    of the same size that reaches the same values.
+
+    One search never meets the same board twice (each guess splits the board on one location's values), so the
+    table pays off across searches: reduceClues counting a grid with one clue fewer at a time, or a puzzle solved
+    and then checked for uniqueness. maxSize bounds the entries kept."""
+
+    def __init__(self, maxSize=1 << 18):
+        self.maxSize = maxSize
+        self.counts = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, key):
+        # the board's solution count if it was counted before - otherwise None
+        count = self.counts.get(key)
+        if count is None:
+            self.misses += 1
+            return None
+        self.counts.move_to_end(key)
+        self.hits += 1
+        return count
+
+    def add(self, key, count):
+        self.counts[key] = count
+        self.counts.move_to_end(key)
+        if len(self.counts) > self.maxSize:
+            self.counts.popitem(last=False)
+
+
+##################################################
+# VECTORIZED PROPAGATION
+##################################################
+# numpy versions of peer elimination and the naked and hidden singles, run over a whole batch of boards held as
+# an (N, 81) array of the usual 9-bit masks - the tables are built on first use since numpy is optional
+vectorTables = None
+
+
+def importNumpy(user='vectorized propagation'):
+    # load numpy into the module the first time something needs it, or raise RuntimeError if it isn't installed
+    global numpy
+    if numpy is None:
+        try:
+            import numpy
+        except ImportError:
+            raise RuntimeError(user + ' needs numpy')
+    return numpy
+
+
+def buildVectorTables():
+    global vectorTables
+    importNumpy()
+
+    if vectorTables is None:
+        # puzzle character -> starting mask ('0' and '.' are blanks, anything else unknown becomes an empty mask)
+        charMask = numpy.zeros(256, dtype=numpy.uint16)
+        charMask[[ord('0'), ord('.')]] = allDigits
+        for n in range(1, 10):
+            charMask[ord(str(n))] = digitBit[n]
+
+        # mask -> the character it's printed as ('0' while it's still open)
+        maskChar = numpy.full(512, ord('0'), dtype=numpy.uint8)
+        for n in range(1, 10):
+            maskChar[digitBit[n]] = ord(str(n))
+
+        vectorTables = (
+            numpy.array(allUnits, dtype=numpy.intp),  # unit -> its 9 locations
+            numpy.array(unitIdsOf, dtype=numpy.intp),  # location -> its 3 units
+            numpy.array(bitCount, dtype=numpy.uint8),  # mask -> number of possibilities
+            numpy.array(digitBit[1:], dtype=numpy.uint16),  # value - 1 -> mask
+            charMask,
+            maskChar,
+        )
+
+    return vectorTables
+
+
+def propagateBoards(masks):
+    # spread the known values on every board in masks (updated in place) until none of them changes,
+    # and return (solved, broken) - broken boards ran into a contradiction and are left as they were then
+    units, cellUnits, counts, bits = buildVectorTables()[:4]
+    broken = numpy.zeros(len(masks), dtype=bool)
+    active = numpy.arange(len(masks))
+
+    while len(active):
+        board = masks[active]
+        before = board.copy()
+
+        # a placed value may only appear once in each unit
+        single = counts[board] == 1
+        fixed = numpy.where(single, board, 0)
+        fixedIn = (fixed[:, units, None] & bits) != 0  # board, unit, location in the unit, value
+        clash = (fixedIn.sum(axis=2) > 1).any(axis=(1, 2))
+
+        # every unit gathers its placed values, and each open location drops the ones from its 3 units
+        unitFixed = numpy.bitwise_or.reduce(fixed[:, units], axis=2)
+        peerFixed = numpy.bitwise_or.reduce(unitFixed[:, cellUnits], axis=2)
+        peerFixed[single] = 0
+        board &= ~peerFixed
+
+        # a value with nowhere left to go in a unit is a dead end, and one with a single place left goes there
+        possibleIn = (board[:, units, None] & bits) != 0
+        places = possibleIn.sum(axis=2)
+        clash |= (places == 0).any(axis=(1, 2)) | (board == 0).any(axis=1)
+        b, u, d = numpy.nonzero((places == 1) & ~fixedIn.any(axis=2))
+        board[b, units[u, possibleIn[b, u, :, d].argmax(axis=1)]] = bits[d]
+
+        # a board that settles without a clash has been checked on its final state, so it's either solved or stuck
+        masks[active] = board
+        broken[active[clash]] = True
+        active = active[(board != before).any(axis=1) & ~clash]
+
+    solved = (counts[masks] == 1).all(axis=1) & ~broken
+    return solved, broken
+
+
+def solveVectorized(puzzles, batchSize=4096, workers=1, chunksize=64, backend='strategies', maxNodes=None,
+                    maxTime=None, maxDepth=None, stats=None, profiler=None):
+    # solveMany for corpora that are mostly solved without guessing: puzzles are propagated batchSize at a time
+    # with numpy, and only the boards left open go on to solvePuzzle (in a pool unless workers is 1) -
+    # so those are the only ones profiler (a ProfileCollector, if any) gets to see
+    # yields (index, solution) pairs in input order, a batch at a time
+    units, cellUnits, counts, bits, charMask, maskChar = buildVectorTables()
+    work = partial(solveLine, backend=backend, maxNodes=maxNodes, maxTime=maxTime, maxDepth=maxDepth,
+                   collectStats=stats is not None, **profileOptions(profiler))
+    jobs = enumerate(puzzles)
+
+    import multiprocessing
+    pool = multiprocessing.Pool(workers, initWorker, (workerSettings(),)) if workers != 1 else None
+    try:
+        while True:
+            batch = list(islice(jobs, batchSize))
+            if not batch:
+                break
+
+            start = time.perf_counter_ns()
+            wellFormed = [job for job in batch if len(job[1]) == 81]
+            text = ''.join(puzzle for index, puzzle in wellFormed).encode('ascii', 'replace')
+            masks = charMask[numpy.frombuffer(text, dtype=numpy.uint8)].reshape(-1, 81)
+            if stats is not None:
+                openBefore = int(counts[masks].sum())
+                singlesBefore = int((counts[masks] == 1).sum())
+            solved, broken = propagateBoards(masks)
+
+            # solved boards are done, open ones go on with what was deduced so far, and broken or
+            # malformed ones start over from the original puzzle so solvePuzzle has the last word on them
+            rendered = maskChar[masks].tobytes().decode('ascii')
+            results = {}
+            leftovers = [job for job in batch if len(job[1]) != 81]
+            for k, (index, puzzle) in enumerate(wellFormed):
+                board = rendered[k * 81:k * 81 + 81]
+                if solved[k]:
+                    results[index] = board
+                else:
+                    leftovers.append((index, puzzle if broken[k] else board))
+
+            if stats is not None:
+                stats.puzzles += len(batch) - len(leftovers)
+                stats.countStrategy('propagateBoards', int((counts[masks] == 1).sum()) - singlesBefore,
+                                    openBefore - int(counts[masks].sum()), time.perf_counter_ns() - start)
+                stats.countPhase('propagation', time.perf_counter_ns() - start)
+
+            searched = map(work, leftovers) if pool is None else pool.imap_unordered(work, leftovers, chunksize)
+            for index, solution, puzzleStats, profile in searched:
+                results[index] = solution
+                if stats is not None:
+                    stats.merge(puzzleStats)
+                if profile is not None:
+                    profiler.add(index, profile)
+
+            for index, puzzle in batch:
+                yield index, results[index]
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+
+##################################################
+# GENERATOR
+##################################################
+# what a puzzle needs to be solved: the singles in propagate(), the block patterns in removePossibilities2/3
+# on top of them, or guessing
+GRADES = ['easy', 'medium', 'hard']
+
+
+def gradePuzzle(puzzle):
+    # the first of GRADES that's enough to solve the puzzle, or None if it can't be solved at all
+    sudokuList, solvedList = newBoard(puzzle)
+    if sudokuList is None or not propagate(sudokuList, solvedList):
+        return None
+    if 1 not in solvedList:
+        return 'easy'
+
+    if not deduce(sudokuList, solvedList):
+        return None
+    if 1 not in solvedList:
+        return 'medium'
+
+    return 'hard' if guessValues(sudokuList, solvedList).status == SOLVED else None
+
+
+def randomGrid(rng):
+    # a random full grid - the 3 blocks on the diagonal don't share any units, so they can be filled in
+    # with shuffled values before solving for the rest
+    puzzle = ['0'] * 81
+    for b in (0, 4, 8):
+        for i, value in zip(allBlocks[b], rng.sample('123456789', 9)):
+            puzzle[i] = value
+
+    return solvePuzzle(*splitPuzzle(''.join(puzzle)))
+
+
+def reduceClues(grid, rng):
+    # take clues out of a full grid in random order, putting back any whose removal lets in a second solution
+    # taking more out never brings the count back down, so every clue left at the end is needed
+    puzzle = list(grid)
+    for i in rng.sample(range(81), 81):
+        puzzle[i] = '0'
+        if countSolutions(''.join(puzzle), 2) != 1:
+            puzzle[i] = grid[i]
+
+    return ''.join(puzzle)
+
+
+def generatePuzzle(seed=None):
+    # a minimal puzzle with a unique solution, as (puzzle, solution, grade) - the same seed gives the same puzzle
+    rng = random.Random(seed)
+    grid = randomGrid(rng)
+    puzzle = reduceClues(grid, rng)
+    return puzzle, grid, gradePuzzle(puzzle)
+
+
+def generateMany(count, grades=None, seed=0, workers=None, chunksize=8):
+    # yield count generated (puzzle, solution, grade) triples, keeping only the grades asked for (default: all)
+    # puzzles come from seeds seed, seed + 1, ... spread over a process pool a window at a time,
+    # so a run can be repeated exactly
+    import multiprocessing
+    window = chunksize * (workers or os.cpu_count() or 1)
+    pool = multiprocessing.Pool(workers, initWorker, (workerSettings(),)) if workers != 1 else None
+    made = 0
+    try:
+        while made < count:
+            seeds = range(seed, seed + window)
+            seed += window
+            for result in map(generatePuzzle, seeds) if pool is None else pool.imap(generatePuzzle, seeds, chunksize):
+                if grades is None or result[2] in grades:
+                    yield result
+                    made += 1
+                    if made >= count:
+                        break
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+
+##################################################
+# SOLVING SERVICE
+##################################################
+# a line protocol over TCP - each request is a puzzle on its own line (or STATS), and each gets one reply line,
+# in order: "SOLVED <solution>", "UNSOLVABLE", "TIMEOUT" (the search budget ran out), "ERROR <reason>",
+# or "STATS <json counters>"
+def serveLine(puzzle, backend='strategies', maxNodes=None, maxTime=None):
+    # solve one puzzle for the service in a worker process, returning its reply
+    valueList, solvedList = splitPuzzle(puzzle)
+    stats = SolveStats()
+    solution = solvePuzzle(valueList, solvedList, maxNodes, maxTime, None, backend, stats)
+    if '0' not in solution:
+        return 'SOLVED ' + solution
+    problem = validatePuzzle(puzzle, True)
+    if problem is not None:
+        return 'ERROR ' + problem
+    return 'TIMEOUT' if stats.outcomes.get(BUDGET_EXCEEDED) else 'UNSOLVABLE'
+
+
+class SolveService(object):
+    """Answers puzzles from a process pool so guessing never blocks the event loop.
+
+    At most maxPending requests are admitted at once (queued, being solved or waiting for their reply to go out) -
+    past that the service stops reading from its connections, so clients feel the backpressure through TCP
+    instead of the queue growing.
+    Every puzzle gets maxTime seconds of guessing (and maxNodes guesses) before it's answered with TIMEOUT,
+    and a puzzle that's already being solved for someone else waits on that answer instead of starting over."""
+
+    def __init__(self, workers=None, maxPending=64, backend='strategies', maxNodes=None, maxTime=1.0):
+        import concurrent.futures
+        import multiprocessing
+
+        # workers start on the first request, from inside a connection handler - forked ones would inherit
+        # the listening socket and every client socket open at the time, and hold those connections open
+        method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        self.executor = concurrent.futures.ProcessPoolExecutor(workers, multiprocessing.get_context(method),
+                                                               initWorker, (workerSettings(),))
+        self.maxPending = maxPending
+        self.slots = None
+        self.inFlight = {}
+        self.backend = backend
+        self.maxNodes = maxNodes
+        self.maxTime = maxTime
+        self.counters = {'requests': 0, 'coalesced': 0, 'errors': 0, 'connections': 0}
+
+    async def serve(self, host='127.0.0.1', port=8765):
+        # accept connections until cancelled
+        import asyncio
+        server = await asyncio.start_server(self.handleClient, host, port)
+        traceLogger().info('serving on %s', ', '.join(str(sock.getsockname()) for sock in server.sockets))
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.close()
+
+    async def handleClient(self, reader, writer):
+        # read requests as long as there's room for them, and queue their answers up to be sent back in order
+        # every queued answer holds a slot until sendReplies() has written it out
+        import asyncio
+        if self.slots is None:
+            self.slots = asyncio.Semaphore(self.maxPending)
+        self.counters['connections'] += 1
+        replies = asyncio.Queue()
+        sender = asyncio.ensure_future(self.sendReplies(replies, writer))
+        try:
+            while True:
+                await self.slots.acquire()
+                queued = False
+                try:
+                    try:
+                        line = await reader.readline()
+                    except ConnectionError:
+                        line = b''
+                    except ValueError:
+                        # past the stream's limit - whatever follows can't be told apart from the next request,
+                        # so answer this one and hang up
+                        self.counters['errors'] += 1
+                        tooLong = asyncio.get_running_loop().create_future()
+                        tooLong.set_result('ERROR line too long')
+                        replies.put_nowait(tooLong)
+                        queued = True
+                        break
+
+                    request = line.strip().decode('ascii', 'replace')
+                    if not request:
+                        if not line:
+                            break
+                        continue
+
+                    replies.put_nowait(asyncio.ensure_future(self.answer(request)))
+                    queued = True
+                finally:
+                    if not queued:
+                        self.slots.release()
+        finally:
+            replies.put_nowait(None)
+            await sender
+            writer.close()
+
+    async def sendReplies(self, replies, writer):
+        # a client that hangs up early still has its requests run to completion, they just aren't sent
+        # each request's slot is only given back once its reply has drained, so a client that stops reading
+        # its replies stops having its requests read too
+        connected = True
+        while True:
+            task = await replies.get()
+            if task is None:
+                return
+            try:
+                reply = await task
+                if connected:
+                    try:
+                        writer.write(reply.encode('ascii') + b'\n')
+                        await writer.drain()
+                    except ConnectionError:
+                        connected = False
+            finally:
+                self.slots.release()
+
+    async def answer(self, request):
+        import asyncio
+        if request == 'STATS':
+            return 'STATS ' + json.dumps(dict(self.counters, pending=len(self.inFlight)), sort_keys=True)
+
+        self.counters['requests'] += 1
+        puzzle = request.replace('.', '0')
+        problem = validatePuzzle(puzzle)
+        if problem is not None:
+            self.counters['errors'] += 1
+            return 'ERROR ' + problem
+
+        # the same puzzle asked for again while it's being solved shares the first answer
+        task = self.inFlight.get(puzzle)
+        if task is None:
+            loop = asyncio.get_running_loop()
+            work = partial(serveLine, puzzle, self.backend, self.maxNodes, self.maxTime)
+            task = self.inFlight[puzzle] = asyncio.ensure_future(loop.run_in_executor(self.executor, work))
+            task.add_done_callback(lambda task: self.inFlight.pop(puzzle, None))
+        else:
+            self.counters['coalesced'] += 1
+
+        try:
+            return await asyncio.shield(task)
+        except Exception as error:
+            self.counters['errors'] += 1
+            return 'ERROR ' + (str(error) or type(error).__name__)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+##################################################
+# SPLIT SEARCH
+##################################################
+# one hard puzzle's search spread over a process pool, for when a single board is what's slow: the first few
+# levels of guesses are made here, breadth first, and each board still open after them is searched by a worker
+def expandFrontier(sudokuList, solvedList, width):
+    # guess a level at a time from a propagated board until there are at least width open boards, or nothing is
+    # left open - returns (the open boards as puzzles, the solutions found on the way, guesses made, levels)
+    symbols = sudokuList.geometry.symbols
+    maskValues = sudokuList.geometry.maskValues
+    passes = searchPasses
+    frontier = [(sudokuList, solvedList)]
+    solutions = []
+    nodes = 0
+    levels = 0
+    while frontier and len(frontier) < width:
+        level = []
+        for board, flags in frontier:
+            node = pickLocation(board)
+            for value in maskValues[board.masks[node]]:
+                nodes += 1
+                child = board.copy()
+                childFlags = flags[:]
+                if placeValue(child, childFlags, node, value, 2) and \
+                        (deduce(child, childFlags, passes) if passes else propagate(child, childFlags)):
+                    if 1 in childFlags:
+                        level.append((child, childFlags))
+                    else:
+                        solutions.append(''.join(symbols[v] for v in child.values))
+        frontier = level
+        levels += 1
+
+    boards = [''.join(symbols[v] for v in board.values) for board, flags in frontier]
+    return boards, solutions, nodes, levels
+
+
+def searchSubtree(puzzle, limit=1, maxNodes=None, deadline=None):
+    # search one of splitSearch's boards in a worker, returning (SearchResult, solution or None)
+    # deadline is a time.time() shared by every worker, so the whole search keeps to one time budget
+    maxTime = None if deadline is None else max(0.0, deadline - time.time())
+    sudokuList, solvedList = newBoard(puzzle)
+    if sudokuList is None or not deduce(sudokuList, solvedList):
+        return SearchResult(UNSOLVABLE, 0, 0, 0, 0), None
+
+    result = guessValues(sudokuList, solvedList, maxNodes, maxTime, None, limit)
+    if 1 in solvedList:
+        return result, None
+    return result, ''.join(sudokuList.geometry.symbols[v] for v in sudokuList.values)
+
+
+def splitSearch(puzzle, limit=1, workers=None, width=None, maxNodes=None, maxTime=None, stats=None):
+    # search a puzzle across a process pool (one process per CPU by default) until limit solutions turn up,
+    # splitting it into at least width subtrees first (default: 4 per worker) - the pool is stopped as soon as
+    # there are enough, so limit 1 is a parallel solve and a bigger one a parallel countSolutions
+    # returns (solutions found up to limit, or None if the budget ran out first, and the first solution or None)
+    # maxNodes caps the guesses in each subtree, and maxTime the seconds for the whole search
+    import multiprocessing
+    deadline = None if maxTime is None else time.time() + maxTime
+    workers = workers or os.cpu_count() or 1
+    if stats is not None:
+        stats.puzzles += 1
+
+    sudokuList, solvedList = newBoard(puzzle, stats)
+    if sudokuList is None or not deduce(sudokuList, solvedList):
+        return 0, None
+    if 1 not in solvedList:
+        return 1, ''.join(sudokuList.geometry.symbols[v] for v in sudokuList.values)
+
+    boards, solutions, nodes, levels = expandFrontier(sudokuList, solvedList, width or 4 * workers)
+    found = solutions[0] if solutions else None
+    count = len(solutions)
+    depth = levels
+    backtracks = 0
+    outOfBudget = False
+
+    if count < limit and boards:
+        work = partial(searchSubtree, limit=limit, maxNodes=maxNodes, deadline=deadline)
+        pool = multiprocessing.Pool(min(workers, len(boards)), initWorker, (workerSettings(),))
+        try:
+            for result, solution in pool.imap_unordered(work, boards):
+                nodes += result.nodes
+                depth = max(depth, levels + result.depth)
+                backtracks += result.backtracks
+                count += result.solutions
+                outOfBudget = outOfBudget or result.status == BUDGET_EXCEEDED
+                if found is None:
+                    found = solution
+                if count >= limit:
+                    break
+        finally:
+            pool.terminate()
+
+    # ends the way guessValues would have: out of budget if that cut the search short of limit solutions
+    if count < limit and outOfBudget:
+        status = BUDGET_EXCEEDED
+    else:
+        status = SOLVED if count else UNSOLVABLE
+    if stats is not None:
+        stats.countSearch(SearchResult(status, nodes, depth, backtracks, min(count, limit)))
+    if status == BUDGET_EXCEEDED:
+        return None, found
+    return min(count, limit), found
+
+
+##################################################
+# BATCH SOLVING
+##################################################
+def solveLine(job, backend='strategies', maxNodes=None, maxTime=None, maxDepth=None, collectStats=False, limit=None,
+              profileMode=None, profileInterval=0.001):
+    # solve one (index, puzzle) pair from solveMany - kept at module level so the pool can pickle it
+    # returns (index, solution, SolveStats or None, PuzzleProfile or None)
+    # a puzzle that gets turned away comes back as "ERROR <reason>", like the solving service answers it
+    index, puzzle = job
+    stats = SolveStats() if collectStats else None
+    problem = validatePuzzle(puzzle)
+    if problem is not None:
+        if stats is not None:
+            stats.countRejection(problem)
+        return index, 'ERROR ' + problem, stats, None
+
+    if limit is not None:
+        count = countSolutions(puzzle, limit, maxNodes, maxTime, stats)
+        return index, '?' if count is None else str(count), stats, None
+
+    profile = PuzzleProfile(profileMode, profileInterval) if profileMode is not None else None
+    valueList, solvedList = splitPuzzle(puzzle)
+    solution = solvePuzzle(valueList, solvedList, maxNodes, maxTime, maxDepth, backend, stats, profile)
+
+    # only a board left unsolved could have contradicted itself, so only those get propagated again to find out
+    if '0' in solution:
+        problem = validatePuzzle(puzzle, True)
+        if problem is not None:
+            return index, 'ERROR ' + problem, stats, profile
+    return index, solution, stats, profile
+
+
+def solveMany(puzzles, workers=None, chunksize=64, ordered=True, backend='strategies', maxNodes=None, maxTime=None,
+              maxDepth=None, stats=None, cache=None, limit=None, profiler=None):
+    # solve an iterable of 81 character puzzles across a process pool (one process per CPU by default),
+    # yielding (index, solution) pairs in input order, or as they finish if ordered is False
+    # puzzles are handed out chunksize at a time to cut down on inter-process traffic
+    # if stats is a SolveStats, every puzzle's counters get merged into it
+    # if cache is a SolutionCache, puzzles it already knows are answered here and never reach a worker
+    # with a limit, each puzzle's number of solutions (up to limit, '?' if the budget ran out) comes back instead
+    # of its solution, and the cache is left out of it
+    # if profiler is a ProfileCollector, every puzzle that gets solved is profiled and handed to it
+    work = partial(solveLine, backend=backend, maxNodes=maxNodes, maxTime=maxTime, maxDepth=maxDepth,
+                   collectStats=stats is not None, limit=limit, **profileOptions(profiler))
+    if limit is not None:
+        cache = None
+    jobs = enumerate(puzzles)
+
+    # a single worker isn't worth the pool
+    if workers == 1:
+        for index, puzzle in jobs:
+            solution = cache.lookup(puzzle) if cache is not None else None
+            if solution is None:
+                index, solution, puzzleStats, profile = work((index, puzzle))
+                if stats is not None:
+                    stats.merge(puzzleStats)
+                if profile is not None:
+                    profiler.add(index, profile)
+                if cache is not None:
+                    cache.add(puzzle, solution)
+            yield index, solution
+        return
+
+    # the pool would swallow the whole input up front, so feed it a window at a time -
+    # the next window is already being solved while the previous one's results are handed back
+    import multiprocessing
+    window = chunksize * (workers or os.cpu_count() or 1) * 4
+    with multiprocessing.Pool(workers, initWorker, (workerSettings(),)) as pool:
+        imap = pool.imap if ordered else pool.imap_unordered
+        pending = None
+        while True:
+            batch = list(islice(jobs, window))
+            current = None
+            if batch:
+                known = {}
+                misses = batch
+                if cache is not None:
+                    misses = []
+                    for job in batch:
+                        solution = cache.lookup(job[1])
+                        if solution is None:
+                            misses.append(job)
+                        else:
+                            known[job[0]] = solution
+                current = (batch, known, imap(work, misses, chunksize))
+
+            if pending is not None:
+                for result in collectWindow(pending, ordered, stats, cache, profiler):
+                    yield result
+            if current is None:
+                break
+            pending = current
+
+
+def collectWindow(window, ordered, stats, cache, profiler=None):
+    # hand back one of solveMany's windows, slotting the cache hits in among what the pool solved
+    batch, known, solved = window
+    puzzles = dict(batch) if cache is not None else None
+
+    def finish(result):
+        index, solution, puzzleStats, profile = result
+        if stats is not None:
+            stats.merge(puzzleStats)
+        if profile is not None:
+            profiler.add(index, profile)
+        if cache is not None:
+            cache.add(puzzles[index], solution)
+        return index, solution
+
+    if ordered:
+        solved = iter(solved)
+        for index, puzzle in batch:
+            yield (index, known[index]) if index in known else finish(next(solved))
+    else:
+        for index in known:
+            yield index, known[index]
+        for result in solved:
+            yield finish(result)
+
+
+def solveBatch(args):
+    # the batch command: one puzzle per line in, one solution per line out
+    # if the input lines come with solutions, report how many of ours matched them
+    expected = {}
+    counts = {'checked': 0, 'matched': 0}
+    stats = SolveStats() if args.stats else None
+    cache = SolutionCache(args.cache, args.cache_file) if args.cache or args.cache_file else None
+    profiler = newProfiler(args)
+
+    # with --count there's nothing to match the solutions against, so they aren't kept either
+    def puzzles():
+        for index, (puzzle, solution) in enumerate(readPuzzles(args.batch)):
+            if solution is not None and args.count is None:
+                expected[index] = solution
+            yield puzzle
+
+    def lines():
+        if args.vectorized:
+            results = solveVectorized(puzzles(), args.vectorized, args.workers, args.chunksize, args.backend,
+                                      args.max_nodes, args.max_time, args.max_depth, stats, profiler)
+        else:
+            results = solveMany(puzzles(), args.workers, args.chunksize, not args.unordered, args.backend,
+                                args.max_nodes, args.max_time, args.max_depth, stats, cache, args.count, profiler)
+        for index, solution in results:
+            if index in expected:
+                counts['checked'] += 1
+                counts['matched'] += expected.pop(index) == solution
+            yield str(index) + ' ' + solution if args.unordered else solution
+
+    try:
+        writeLines(lines(), args.output)
+    finally:
+        if cache is not None:
+            cache.close()
+        if profiler is not None:
+            profiler.close()
+
+    if counts['checked']:
+        sys.stderr.write(str(counts['matched']) + '/' + str(counts['checked']) + ' solutions matched the input\n')
+    if stats is not None:
+        sys.stderr.write(json.dumps(stats.asDict(), indent=2, sort_keys=True) + '\n')
+
+
+def generateCorpus(args):
+    # the generate command: one "puzzle solution grade" line per generated puzzle,
+    # which readPuzzles (and so the batch command and the benchmarks) can read back
+    results = generateMany(args.generate, args.grade, args.seed, args.workers)
+    writeLines((' '.join(result) for result in results), args.output)
+
+
+def newProfiler(args):
+    # the ProfileCollector the solve and batch commands' --profile options ask for, if any
+    if args.profile is None:
+        return None
+    return ProfileCollector(args.profile, args.profiler, args.profile_interval / 1000, args.profile_each)
+
+
+def solveGiven(args):
+    # the solve command: one line per puzzle given on the command line - its solution (or its number of
+    # solutions with --count), and the board itself with --pretty - or the scraped puzzle if there aren't any
+    if not args.puzzles:
+        return solveScraped(args)
+
+    stats = SolveStats() if args.stats else None
+    profiler = newProfiler(args)
+    failures = 0
+    for index, puzzle in enumerate(args.puzzles):
+        problem = validatePuzzle(puzzle)
+        if problem is not None:
+            sys.stderr.write(puzzle + ': ' + problem + '\n')
+            failures += 1
+            continue
+
+        if args.count is not None:
+            if args.split is not None:
+                count = splitSearch(puzzle, args.count, args.split or None, None, args.max_nodes, args.max_time,
+                                    stats)[0]
+            else:
+                count = countSolutions(puzzle, args.count, args.max_nodes, args.max_time, stats)
+            print('?' if count is None else count)
+            failures += not count
+            continue
+
+        # splitSearch has no board to show for a puzzle it couldn't solve, so that's printed as it was given
+        if args.split is not None:
+            result = splitSearch(puzzle, 1, args.split or None, None, args.max_nodes, args.max_time, stats)[1]
+            result = result or puzzle
+        else:
+            profile = profiler.newProfile() if profiler is not None else None
+            valueList, solvedList = splitPuzzle(puzzle)
+            result = solvePuzzle(valueList, solvedList, args.max_nodes, args.max_time, args.max_depth, args.backend,
+                                 stats, profile)
+            if profile is not None:
+                profiler.add(index, profile)
+
+        # an unsolved board might have contradicted itself before any guessing - if so, say how
+        if '0' in result:
+            problem = validatePuzzle(puzzle, True)
+            if problem is not None:
+                sys.stderr.write(puzzle + ': ' + problem + '\n')
+                failures += 1
+                continue
+        if args.pretty:
+            printPuzzle(result)
+        else:
+            print(result)
+        failures += '0' in result
+
+    if profiler is not None:
+        profiler.close()
+    if stats is not None:
+        sys.stderr.write(json.dumps(stats.asDict(), indent=2, sort_keys=True) + '\n')
+    return 1 if failures else 0
 
-    # difficulty = '0'
-    # difficulties = ['1', '2', '3', '4']
-    # while difficulty not in difficulties:
-    #     difficulty = input('Enter difficulty from 1 (easiest) to 4 (hardest): ')
-    difficulty = '4'
 
-    # site
-    site = "http://view.websudoku.com/?level="+difficulty
+def solveScraped(args):
+    # solve a puzzle from websudoku.com, printing it before and after along with how long it took
+    site = "http://view.websudoku.com/?level=" + args.difficulty
 
-    # regex
+    # regex - values is the whole answer, so the puzzle itself is only the values that aren't blanked out
     values, solved = parsePuzzle(site)
+    puzzle = ''.join(v if s == '0' else '0' for v, s in zip(values, solved))
 
     # first print the puzzle unsolved
     printPuzzle(values, solved)
 
     # start timer
-    start = time.time()
+    start = time.perf_counter()
 
     # solve the puzzle
-    result = solvePuzzle(values, solved)
+    stats = SolveStats() if args.stats else None
+    profiler = newProfiler(args)
+    profile = profiler.newProfile() if profiler is not None else None
+    # checking for a second solution afterwards gets to skip what solving already ruled out
+    table = TranspositionTable()
+    result = solvePuzzle(values, solved, args.max_nodes, args.max_time, args.max_depth, args.backend, stats, profile,
+                         table)
+    if profile is not None:
+        profiler.add('websudoku', profile)
+        profiler.close()
 
     # print the solved puzzle
     printPuzzle(result)
@@ -694,11 +3083,207 @@ def main():
         print('Alternate solution found. Matches: ' + str(knowns) + '/81')
     else:
         print('No solution possible.')
+    if '0' not in result:
+        print('The puzzle has ' + ('a unique solution.' if isUnique(puzzle, table=table) else 'more than one solution.'))
 
     # print time it took
-    print("Time: " + str(int(time.time() - start)) + " seconds")
+    print("Time: " + str(round((time.perf_counter() - start) * 1000, 3)) + " ms")
+
+    if stats is not None:
+        print(json.dumps(stats.asDict(), indent=2, sort_keys=True))
+    return 0
+
+
+def checkSolutions(args):
+    # the check command: every "puzzle solution" line in the file has to hold a correct solution -
+    # the ones that don't are listed by line number (counting puzzles from 1), and fail the command
+    counts = {'checked': 0, 'failed': 0}
+
+    def pairs():
+        for pair in readPuzzles(args.check):
+            counts['checked'] += 1
+            yield pair
+
+    for index, reason in checkMany(pairs()):
+        counts['failed'] += 1
+        print(str(index + 1) + ': ' + reason)
+
+    checked, failures = counts['checked'], counts['failed']
+    sys.stderr.write(str(checked - failures) + '/' + str(checked) + ' solutions are correct\n')
+    return 1 if failures else 0
+
+
+def packCorpus(args):
+    try:
+        count = writePacked(readPuzzles(args.pack), args.output)
+    except ValueError as error:
+        sys.stderr.write(args.pack + ': ' + str(error) + '\n')
+        return 1
+    sys.stderr.write(str(count) + ' boards packed\n')
+
+
+def unpackCorpus(args):
+    with PackedPuzzles(args.unpack) as packed:
+        writeLines((puzzle if solution is None else puzzle + ' ' + solution for puzzle, solution in packed),
+                   args.output)
+
+
+def serveForever(args):
+    import asyncio
+
+    host, port = args.serve.rpartition(':')[::2]
+    service = SolveService(args.workers, args.max_pending, args.backend, args.max_nodes,
+                           1.0 if args.max_time is None else args.max_time)
+    try:
+        asyncio.run(service.serve(host or '127.0.0.1', int(port)))
+    except KeyboardInterrupt:
+        pass
+
+
+def main(argv=None):
+    # subcommands: solve (the default), batch, bench, generate, check, pack, unpack and serve
+    # each only imports what it needs, so starting up for a single puzzle stays cheap
+    # (anything else up front, like a puzzle or an option, is taken as the start of a solve command)
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] not in ('solve', 'batch', 'bench', 'generate', 'check', 'pack', 'unpack', 'serve',
+                                   '-h', '--help'):
+        argv = ['solve'] + argv
+    if argv[0] == 'bench':
+        import sudokuBench
+        return sudokuBench.main(argv[1:])
+
+    # options shared by every command that solves puzzles
+    solving = argparse.ArgumentParser(add_help=False)
+    solving.add_argument('--backend', choices=['strategies', 'dlx'], default='strategies')
+    solving.add_argument('--max-nodes', type=int, help='give up on a puzzle after this many guesses')
+    solving.add_argument('--max-time', type=float, help='give up on a puzzle after this many seconds of guessing')
+    solving.add_argument('--max-depth', type=int, help='never stack up more than this many guesses')
+    solving.add_argument('--passes', metavar='NAMES',
+                         help='comma separated strategy passes to run before guessing, in order (default: ' +
+                              ','.join(defaultPasses[True]) + ' on 9x9 boards, ' + ','.join(defaultPasses[False]) +
+                              ' on others) - any of ' + ', '.join(strategyPasses))
+    solving.add_argument('--search-passes', metavar='NAMES', default='',
+                         help='comma separated strategy passes to run after every guess as well (default: none)')
+    solving.add_argument('--stats', action='store_true', help='print strategy and search counters as JSON')
+    solving.add_argument('-v', '--verbose', action='count', default=0,
+                         help='log a summary of each puzzle to stderr, or every step with -vv')
+
+    # options for the commands that can profile their puzzles
+    profiling = argparse.ArgumentParser(add_help=False)
+    profiling.add_argument('--profile', metavar='DIR',
+                           help='profile PART 1 and PART 2 of every puzzle solved, writing the results to DIR - '
+                                'all.<phase>.pstats, or all.folded for flame graphs with --profiler sample')
+    profiling.add_argument('--profiler', choices=['cprofile', 'sample'], default='cprofile',
+                           help='cprofile (every call, exact but slow) or sample (the stack every '
+                                '--profile-interval of CPU time, Unix only) - default: cprofile')
+    profiling.add_argument('--profile-interval', type=float, default=1.0, metavar='MS',
+                           help='milliseconds between samples for --profiler sample (default: 1)')
+    profiling.add_argument('--profile-each', type=float, nargs='?', const=0, metavar='MS',
+                           help='also write each puzzle that took at least MS milliseconds (default: 0, so all of '
+                                'them) on its own, as puzzle-<index>')
+
+    # options for the commands that spread their work over a process pool
+    pooled = argparse.ArgumentParser(add_help=False)
+    pooled.add_argument('--workers', type=int, help='worker processes (default: one per CPU)')
+    pooled.add_argument('--chunksize', type=int, default=64, help='puzzles handed to a worker at a time')
+
+    output = argparse.ArgumentParser(add_help=False)
+    output.add_argument('--output', metavar='FILE', default='-', help='where to write (default: stdout)')
+
+    parser = argparse.ArgumentParser(description='Solve, check and generate Sudoku puzzles.')
+    commands = parser.add_subparsers(metavar='COMMAND')
+
+    command = commands.add_parser('solve', parents=[solving, profiling],
+                                  help='solve puzzles given on the command line (default)',
+                                  description='Solve each puzzle given on the command line, printing its solution '
+                                              'on a line of its own, or one scraped from websudoku.com if none are.')
+    command.add_argument('puzzles', nargs='*', metavar='PUZZLE',
+                         help='81 characters, \'0\' or \'.\' for blanks (or 16, 256 or 625 for other sizes)')
+    command.add_argument('--pretty', action='store_true', help='print each solution as a board')
+    command.add_argument('--count', type=int, nargs='?', const=2, metavar='LIMIT',
+                         help='print how many solutions each puzzle has instead, stopping at LIMIT (default: 2)')
+    command.add_argument('--split', type=int, nargs='?', const=0, metavar='WORKERS',
+                         help='search each puzzle across WORKERS processes (default: one per CPU), for single '
+                              'hard puzzles - --max-nodes then caps each worker\'s share, and --max-time the whole')
+    command.add_argument('--difficulty', choices=['1', '2', '3', '4'], default='4',
+                         help='websudoku.com level to scrape when no puzzle is given (default: 4)')
+    command.set_defaults(run=solveGiven)
+
+    command = commands.add_parser('batch', parents=[solving, profiling, pooled, output],
+                                  help='solve a file of puzzles',
+                                  description='Solve one puzzle per line from FILE, writing one solution per line.')
+    command.add_argument('batch', metavar='FILE', help='puzzle file, packed or text ("-" for stdin)')
+    command.add_argument('--unordered', action='store_true',
+                         help='write "index solution" lines as puzzles finish instead of in input order')
+    command.add_argument('--cache', type=int, default=0, metavar='SIZE',
+                         help='keep up to SIZE solutions in memory and reuse them for repeated or transformed puzzles')
+    command.add_argument('--cache-file', metavar='FILE', help='also keep cached solutions on disk in FILE')
+    command.add_argument('--vectorized', type=int, nargs='?', const=4096, default=0, metavar='SIZE',
+                         help='propagate SIZE puzzles at a time with numpy (default: 4096) and only search what is '
+                              'left open - needs numpy, and can\'t be combined with --cache')
+    command.add_argument('--count', type=int, nargs='?', const=2, metavar='LIMIT',
+                         help='write how many solutions each puzzle has instead, stopping at LIMIT (default: 2, '
+                              'so 1 means unique) - "?" if --max-nodes or --max-time ran out first')
+    command.set_defaults(run=solveBatch)
+
+    commands.add_parser('bench', add_help=False, help='benchmark against the bundled corpora (see sudokuBench.py)')
+
+    command = commands.add_parser('generate', parents=[output], help='generate puzzles',
+                                  description='Generate COUNT minimal puzzles with unique solutions, written as '
+                                              '"puzzle solution grade" lines.')
+    command.add_argument('generate', type=int, metavar='COUNT')
+    command.add_argument('--grade', action='append', choices=GRADES,
+                         help='only keep puzzles of this grade (repeatable, default: any)')
+    command.add_argument('--seed', type=int, default=0, help='first random seed')
+    command.add_argument('--workers', type=int, help='worker processes (default: one per CPU)')
+    command.set_defaults(run=generateCorpus)
+
+    command = commands.add_parser('check', help='check a file of solutions',
+                                  description='Check that every "puzzle solution" line in FILE holds a correct '
+                                              'solution, listing the ones that don\'t.')
+    command.add_argument('check', metavar='FILE', help='puzzle file, packed or text ("-" for stdin)')
+    command.set_defaults(run=checkSolutions)
+
+    command = commands.add_parser('pack', parents=[output], help='convert a text corpus to a packed binary file')
+    command.add_argument('pack', metavar='FILE')
+    command.set_defaults(run=packCorpus)
+
+    command = commands.add_parser('unpack', parents=[output], help='convert a packed file back to text lines')
+    command.add_argument('unpack', metavar='FILE')
+    command.set_defaults(run=unpackCorpus)
+
+    command = commands.add_parser('serve', parents=[solving], help='answer puzzles over TCP (see SolveService)',
+                                  description='Answer puzzles over TCP, one per line - --max-time defaults to 1.')
+    command.add_argument('serve', metavar='[HOST:]PORT')
+    command.add_argument('--max-pending', type=int, default=64,
+                         help='requests taken on at once before it stops reading (default: 64)')
+    command.add_argument('--workers', type=int, help='worker processes (default: one per CPU)')
+    command.set_defaults(run=serveForever)
+
+    args = parser.parse_args(argv)
+    if 'passes' in args:
+        try:
+            setPasses(None if args.passes is None else [name for name in args.passes.split(',') if name],
+                      [name for name in args.search_passes.split(',') if name])
+        except ValueError as error:
+            parser.error(str(error))
+    if getattr(args, 'vectorized', 0):
+        try:
+            importNumpy('--vectorized')
+        except RuntimeError as error:
+            parser.error(str(error))
+        if args.cache or args.cache_file:
+            parser.error('--vectorized can\'t be combined with --cache')
+        if args.count is not None:
+            parser.error('--vectorized can\'t be combined with --count')
+
+    if getattr(args, 'verbose', 0):
+        import logging
+        logging.basicConfig(level=logging.INFO, format='%(message)s')
+        setTrace(min(args.verbose, TRACE_STEPS))
+
+    return args.run(args) or 0
 
 
 if __name__ == "__main__":
-    main()
-
+    sys.exit(main())
@@ -0,0 +1,139 @@
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+import unittest
+
+here = os.path.dirname(os.path.abspath(__file__))
+script = os.path.join(os.path.dirname(here), 'sudokuSolver.py')
+sys.path.insert(0, os.path.dirname(here))
+
+import sudokuSolver  # noqa: E402
+puzzles = [
+    '003020600900305001001806400008102900700000008006708200002609500800203009005010300',
+    '110000000000000000000000000000000000000000000000000000000000000000000000000000000',
+    '000000010400000000020000000000050407008000300001090000300400200050100000000806000',
+    '123456780000000009000000000000000000000000000000000000000000000000000000000000000',
+]
+
+
+def freePort():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class ServiceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.port = freePort()
+        self.server = subprocess.Popen([sys.executable, script, 'serve', '127.0.0.1:' + str(self.port),
+                                        '--workers', '2'], stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                self.client = socket.create_connection(('127.0.0.1', self.port), timeout=10)
+                break
+            except ConnectionRefusedError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.05)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.terminate()
+        self.server.wait()
+
+    def testHalfCloseGetsEveryReplyThenEof(self):
+        # the worker processes mustn't keep the client's connection open once the server is done with it
+        self.client.sendall(''.join(puzzle + '\n' for puzzle in puzzles).encode('ascii'))
+        self.client.shutdown(socket.SHUT_WR)
+        received = b''
+        while True:
+            chunk = self.client.recv(65536)
+            if not chunk:
+                break
+            received += chunk
+
+        replies = received.decode('ascii').splitlines()
+        self.assertEqual(len(replies), len(puzzles))
+        self.assertTrue(replies[0].startswith('SOLVED '))
+        self.assertEqual(replies[1], 'ERROR repeats a given')
+        self.assertTrue(replies[2].startswith('SOLVED '))
+        self.assertEqual(replies[3], 'ERROR a location has no possible values')
+
+
+class FakeWriter(object):
+    # stands in for a client connection - drain() holds until reading is set, like a client that isn't reading
+
+    def __init__(self):
+        self.lines = []
+        self.reading = asyncio.Event()
+        self.reading.set()
+
+    def write(self, data):
+        self.lines.append(data.decode('ascii').rstrip('\n'))
+
+    async def drain(self):
+        await self.reading.wait()
+
+    def close(self):
+        pass
+
+
+def clientStream(data):
+    reader = asyncio.StreamReader()
+    reader.feed_data(data)
+    reader.feed_eof()
+    return reader
+
+
+class ServiceSlotsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.service = sudokuSolver.SolveService(workers=1, maxPending=2)
+
+    def tearDown(self):
+        self.service.close()
+
+    def testOverlongLinesGiveTheirSlotsBack(self):
+        async def scenario():
+            for k in range(3):
+                writer = FakeWriter()
+                await asyncio.wait_for(self.service.handleClient(clientStream(b'1' * 70000 + b'\n'), writer), 10)
+                self.assertEqual(writer.lines, ['ERROR line too long'])
+
+            writer = FakeWriter()
+            await asyncio.wait_for(self.service.handleClient(clientStream(puzzles[0].encode('ascii') + b'\n'),
+                                                             writer), 30)
+            self.assertEqual(len(writer.lines), 1)
+            self.assertTrue(writer.lines[0].startswith('SOLVED '))
+
+        asyncio.run(scenario())
+
+    def testClientThatDoesntReadStopsBeingRead(self):
+        async def scenario():
+            writer = FakeWriter()
+            writer.reading.clear()
+            requests = puzzles[0].encode('ascii') + b'\n'
+            handler = asyncio.ensure_future(self.service.handleClient(clientStream(requests * 100), writer))
+            while not writer.lines:
+                await asyncio.sleep(0.05)
+            await asyncio.sleep(0.5)
+
+            # the first reply is stuck, and only the slots' worth of requests have been taken on
+            self.assertFalse(handler.done())
+            self.assertEqual(self.service.counters['requests'], 2)
+
+            writer.reading.set()
+            await asyncio.wait_for(handler, 30)
+            self.assertEqual(len(writer.lines), 100)
+            self.assertEqual(self.service.counters['requests'], 100)
+
+        asyncio.run(scenario())
+
+
+if __name__ == '__main__':
+    unittest.main()